@@ -0,0 +1,31 @@
+"""
+Benchmarks of the spreadsheet synchronization, the database lookups and the handler chain.
+
+Run them with `python -m benchmarks`. Every run works on a fresh temporary database filled with synthetic data,
+uses in-process stand-ins for Google Sheets, Google Drive and the Telegram Bot API, and saves its results as
+JSON so they can be compared with a previous run. `python -m benchmarks.webhook` does the same for the webhook
+server by POSTing synthetic updates to it.
+"""
+
+import os
+import tempfile
+
+
+def prepare_environment():
+    """
+        Points the bot settings at a temporary database and log file, provides a dummy token if none is set and
+        relaxes the per-user throttling so that the replayed conversations are not throttled.
+
+        The bot modules read their settings at import time, so this must run before any of them is imported.
+
+        Returns:
+            str: The temporary directory.
+    """
+    workdir = tempfile.mkdtemp(prefix="benchmarks-")
+    os.environ["DB_NAME"] = os.path.join(workdir, "benchmark.db")
+    os.environ["LOG_FILE"] = os.path.join(workdir, "benchmark.log")
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-BENCHMARK-BENCHMARK-BENCH")
+    # A replayed conversation has consecutive button presses with the same text and no pause between them.
+    os.environ.setdefault("THROTTLE_DUPLICATE_WINDOW", "0")
+
+    return workdir
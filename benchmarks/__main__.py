@@ -0,0 +1,156 @@
+"""
+The command line entry point of the benchmarks.
+
+Usage:
+    python -m benchmarks --accounts 100000 --users 5000 --output results.json --compare baseline.json
+
+The run works on a temporary database and log file, so it never touches the data of a running bot.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+
+from datetime import datetime, timezone
+
+from benchmarks import prepare_environment
+
+
+COMPARED_METRICS = ("throughput", "p50_ms", "p99_ms", "peak_memory_mb", "max_rss_mb")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmarks the synchronization, database lookups and handlers.")
+    parser.add_argument("--accounts", type=int, default=10000, help="Number of accounts in the spreadsheets.")
+    parser.add_argument("--rows-per-account", type=int, default=1, help="Monthly readings per account.")
+    parser.add_argument("--user-input-share", type=float, default=0.1,
+                        help="Share of accounts with a reading submitted through the bot.")
+    parser.add_argument("--change-share", type=float, default=0.01,
+                        help="Share of rows changed before every changed incremental sync.")
+    parser.add_argument("--users", type=int, default=1000, help="Number of bot users, at most one per account.")
+    parser.add_argument("--lookups", type=int, default=10000, help="Number of check_data lookups.")
+    parser.add_argument("--repeat", type=int, default=3, help="Sync cycles measured per scenario.")
+    parser.add_argument("--taps", type=int, default=3,
+                        help="How many times the impatient users of the handler scenario send every update.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Conversations replayed at the same time.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated Google API latency in seconds.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument("--scenarios", nargs="+", default=["sync", "check_data", "handlers"],
+                        choices=["sync", "check_data", "handlers"], help="Scenario groups to run.")
+    parser.add_argument("--trace-memory", action=argparse.BooleanOptionalAction, default=False,
+                        help="Track the peak Python memory with tracemalloc (slows the scenarios down).")
+    parser.add_argument("--writer", action=argparse.BooleanOptionalAction, default=True,
+                        help="Route the writes through the database writer like the bot does.")
+    parser.add_argument("--output", help="Path of the results JSON file (default: benchmarks/results/<time>.json).")
+    parser.add_argument("--compare", help="Path of a previous results JSON file to compare with.")
+
+    return parser.parse_args(argv)
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    from benchmarks import data, scenarios
+    from benchmarks.fakes import FakeGoogle
+    from bot.main import dp
+    from bot.settings import DB_NAME, DB_POOL_SIZE, DB_WRITER_COMMIT_WINDOW, DB_WRITER_MAX_BATCH
+    from database.pool import ConnectionPool
+    from database.writer import DatabaseWriter
+
+    users = min(args.users, args.accounts)
+    google = FakeGoogle(historical_rows=data.make_historical_rows(args.accounts, args.rows_per_account, args.seed),
+                        user_input_rows=data.make_user_input_rows(args.accounts, args.user_input_share, args.seed),
+                        latency=args.latency)
+    telegram_ids, user_accounts = data.make_user_accounts(users, args.accounts)
+
+    results = {}
+    writer = DatabaseWriter(DB_NAME, commit_window=DB_WRITER_COMMIT_WINDOW, max_batch=DB_WRITER_MAX_BATCH)
+    if args.writer:
+        await writer.open()
+
+    async with ConnectionPool(DB_NAME, size=DB_POOL_SIZE):
+        await scenarios.seed_database(user_accounts)
+
+        if "sync" in args.scenarios:
+            results.update(await scenarios.bench_sync(google, repeat=args.repeat, change_share=args.change_share,
+                                                      trace_memory=args.trace_memory))
+        if "check_data" in args.scenarios:
+            results.update(await scenarios.bench_check_data(telegram_ids, lookups=args.lookups, seed=args.seed,
+                                                            trace_memory=args.trace_memory))
+        if "handlers" in args.scenarios:
+            results.update(await scenarios.bench_handlers(telegram_ids, concurrency=args.concurrency,
+                                                          taps=args.taps, trace_memory=args.trace_memory))
+
+        await dp.storage.close()
+
+    await writer.close()
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    """
+        Prints the relative change of every compared metric against a previous run.
+
+        Args:
+            results (dict): The results of this run.
+            baseline (dict): The results of the previous run.
+    """
+    print(f"\nCompared with {baseline['meta'].get('git_revision')} from {baseline['meta']['created_at']}:")
+    for name, summary in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+
+        changes = []
+        for metric in COMPARED_METRICS:
+            if previous.get(metric) and summary.get(metric) is not None:
+                change = (summary[metric] - previous[metric]) / previous[metric] * 100
+                changes.append(f"{metric} {previous[metric]} -> {summary[metric]} ({change:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The bot modules read their settings at import time, so they are imported only after this point.
+    prepare_environment()
+
+    results = asyncio.run(run(args))
+
+    report = {"meta": {"created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "git_revision": get_git_revision(),
+                       "python": sys.version.split()[0],
+                       "sqlite": sqlite3.sqlite_version,
+                       "platform": platform.platform(),
+                       "arguments": {key: value for key, value in vars(args).items()
+                                     if key not in ("output", "compare")}},
+              "results": results}
+
+    output = args.output or os.path.join("benchmarks", "results",
+                                         f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for name, summary in results.items():
+        print(f"{name}: {summary}")
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+This module generates synthetic spreadsheet rows and users for the benchmarks.
+
+The rows have the same layout as the ones returned by google_spreadsheets.functions.get_data_from_sheet, and
+every generator is seeded, so the same arguments always produce the same data.
+"""
+
+import random
+
+from datetime import datetime, timedelta
+
+
+CITIES = ["Kyiv", "Lviv", "Odesa", "Dnipro", "Kharkiv"]
+STREETS = ["Shevchenka", "Franka", "Lesi Ukrainky", "Khreshchatyk", "Sadova", "Zelena"]
+
+
+def make_account_number(index: int) -> str:
+    """
+        Builds the personal account number of the synthetic account with the given index.
+
+        Args:
+            index (int): The index of the account.
+
+        Returns:
+            str: A ten-digit personal account number.
+    """
+    return f"{index + 1000000000}"
+
+
+def format_indicator(value: float) -> str:
+    """
+        Formats an indicator the way Google Sheets returns it, with a no-break space as the thousands separator.
+
+        Args:
+            value (float): The indicator value.
+
+        Returns:
+            str: The formatted indicator.
+    """
+    return f"{value:,.2f}".replace(",", "\xa0")
+
+
+def make_historical_rows(accounts: int, rows_per_account: int = 1, seed: int = 0) -> list:
+    """
+        Generates the rows of the historical spreadsheet (range A:J without the header).
+
+        Args:
+            accounts (int): The number of distinct personal accounts.
+            rows_per_account (int): The number of monthly readings per account. Later rows are newer.
+            seed (int): The seed of the random generator.
+
+        Returns:
+            list: The rows, ordered by date like in the spreadsheet.
+    """
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    indicators = [rng.uniform(0, 5000) for _ in range(accounts)]
+    addresses = [[rng.choice(CITIES), rng.choice(STREETS), str(rng.randint(1, 200)), str(rng.randint(1, 4)),
+                  str(rng.randint(1, 300))] for _ in range(accounts)]
+    rows = []
+    for month in range(rows_per_account):
+        date = (start + timedelta(days=30 * month)).strftime("%d.%m.%Y")
+        for index in range(accounts):
+            indicators[index] += rng.uniform(50, 400)
+            rows.append([str(len(rows) + 1),
+                         *addresses[index],
+                         "electricity",
+                         make_account_number(index),
+                         format_indicator(indicators[index]),
+                         date])
+
+    return rows
+
+
+def make_user_input_rows(accounts: int, share: float = 0.1, seed: int = 0) -> list:
+    """
+        Generates the rows of the user input spreadsheet (range A:F without the header).
+
+        Args:
+            accounts (int): The number of distinct personal accounts.
+            share (float): The share of accounts that have a reading submitted through the bot.
+            seed (int): The seed of the random generator.
+
+        Returns:
+            list: The rows in the layout written by handle_photo.
+    """
+    rng = random.Random(seed + 1)
+    rows = []
+    for index in rng.sample(range(accounts), int(accounts * share)):
+        rows.append([str(round(rng.uniform(5000, 9000), 2)),
+                     make_account_number(index),
+                     f"{rng.choice(CITIES)}, {rng.choice(STREETS)}",
+                     str(rng.randint(10 ** 8, 10 ** 9)),
+                     datetime(2024, 1, 1).strftime("%d.%m.%Y %H:%M"),
+                     "None"])
+
+    return rows
+
+
+def mutate_rows(rows: list, share: float = 0.01, seed: int = 0) -> int:
+    """
+        Changes the indicator of a share of the rows in place, like new readings entered in the spreadsheet.
+
+        Args:
+            rows (list): Rows generated by make_historical_rows.
+            share (float): The share of rows to change.
+            seed (int): The seed of the random generator.
+
+        Returns:
+            int: The number of changed rows.
+    """
+    rng = random.Random(seed)
+    changed = max(1, int(len(rows) * share))
+    for index in rng.sample(range(len(rows)), changed):
+        value = float(rows[index][8].replace("\xa0", "")) + rng.uniform(50, 400)
+        rows[index][8] = format_indicator(value)
+
+    return changed
+
+
+def make_user_accounts(users: int, accounts: int) -> tuple:
+    """
+        Assigns synthetic accounts to synthetic Telegram users for the accounts table.
+
+        Args:
+            users (int): The number of users.
+            accounts (int): The number of distinct personal accounts to pick from.
+
+        Returns:
+            tuple: The Telegram IDs of the users and the accounts table rows.
+    """
+    telegram_ids = [10 ** 8 + user for user in range(users)]
+    rows = [{"personal_account": make_account_number(user % accounts),
+             "telegram_id": telegram_id,
+             "address": f"Address of {make_account_number(user % accounts)}",
+             "last_date": "01.01.2024",
+             "last_indicator": 1000.0} for user, telegram_id in enumerate(telegram_ids)]
+
+    return telegram_ids, rows
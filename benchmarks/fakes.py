@@ -0,0 +1,128 @@
+"""
+This module contains in-process stand-ins for Google Sheets, Google Drive and the Telegram Bot API.
+
+FakeGoogle serves generated rows and revisions in place of google_spreadsheets.functions, optionally with a
+simulated network latency, and FakeSession answers Bot API calls without any network access.
+"""
+
+import asyncio
+import itertools
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, Update, User
+
+
+class FakeGoogle:
+    """
+       Serves the historical and user input spreadsheets and their Drive revisions from memory.
+    """
+    def __init__(self, historical_rows: list, user_input_rows: list, latency: float = 0.0):
+        """
+            Initialize the stand-in.
+
+            Args:
+                historical_rows (list): The rows of the historical spreadsheet.
+                user_input_rows (list): The rows of the user input spreadsheet.
+                latency (float): Seconds every call waits, to simulate the network round trip.
+        """
+        self.historical_rows = historical_rows
+        self.user_input_rows = user_input_rows
+        self.latency = latency
+        self.revisions = {False: 1, True: 1}
+        self.appended_rows = []
+        self.calls = 0
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def get_data_from_sheet(self, user_input: bool = False):
+        await self._call()
+        return self.user_input_rows if user_input else self.historical_rows
+
+    async def get_sheet_revision(self, user_input: bool = False):
+        await self._call()
+        return str(self.revisions[user_input])
+
+    async def save_rows_to_sheet(self, rows: list):
+        await self._call()
+        self.appended_rows.extend(rows)
+
+    def bump_revision(self, user_input: bool = False):
+        """
+            Marks a spreadsheet as changed, like an edit in Google Sheets does.
+
+            Args:
+                user_input (bool): Bump the user input spreadsheet instead of the historical one.
+        """
+        self.revisions[user_input] += 1
+
+    @contextmanager
+    def installed(self, *modules):
+        """
+            Replaces the Google functions imported by the given modules with the stand-in while the block runs.
+
+            Args:
+                *modules: Modules that imported functions from google_spreadsheets.functions.
+        """
+        replaced = []
+        for module in modules:
+            for name in ("get_data_from_sheet", "get_sheet_revision", "save_rows_to_sheet"):
+                if hasattr(module, name):
+                    replaced.append((module, name, getattr(module, name)))
+                    setattr(module, name, getattr(self, name))
+        try:
+            yield self
+        finally:
+            for module, name, original in replaced:
+                setattr(module, name, original)
+
+
+class FakeSession(BaseSession):
+    """
+       A Bot API session that answers every request locally and counts the sent messages.
+    """
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        if isinstance(method, SendMessage):
+            return Message(message_id=next(self._message_ids), date=datetime.now(),
+                           chat=Chat(id=method.chat_id, type="private"), text=method.text)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+_update_ids = itertools.count(1)
+
+
+def make_text_update(telegram_id: int, text: str) -> Update:
+    """
+        Builds an update with a private text message, as Telegram delivers it.
+
+        Args:
+            telegram_id (int): The Telegram ID of the sender.
+            text (str): The message text.
+
+        Returns:
+            Update: The update.
+    """
+    update_id = next(_update_ids)
+    user = User(id=telegram_id, is_bot=False, first_name="Benchmark")
+    message = Message(message_id=update_id, date=datetime.now(), chat=Chat(id=telegram_id, type="private"),
+                      from_user=user, text=text)
+
+    return Update(update_id=update_id, message=message)
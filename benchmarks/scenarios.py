@@ -0,0 +1,287 @@
+"""
+This module contains the benchmark scenarios and the Recorder that measures them.
+
+Every scenario records the latency of each of its operations and the number of items (rows, lookups or
+updates) they processed. The summary contains the throughput in items per second, the p50 and p99 operation
+latencies and the peak resident memory of the process after the scenario. With memory tracing enabled it also
+contains the peak Python memory allocated while the scenario ran; tracing slows the scenarios down several
+times, so timings are only comparable between runs with the same setting.
+
+The bot modules read their settings when imported, so this module must be imported after the benchmark
+environment (database, log file and token) is prepared.
+"""
+
+import asyncio
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+
+from benchmarks import data
+from benchmarks.fakes import FakeGoogle, FakeSession, make_text_update
+from bot import functions, texts
+from bot.main import dp
+from bot.metrics import THROTTLED_UPDATES
+from bot.settings import DB_NAME, TOKEN
+from database.main import DatabaseManager
+from google_spreadsheets import mirror
+
+
+def percentile(values: list, share: float) -> float:
+    """
+        Computes a nearest-rank percentile.
+
+        Args:
+            values (list): The measured values.
+            share (float): The percentile as a share, e.g. 0.99.
+
+        Returns:
+            float: The percentile, or 0.0 for no values.
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def get_max_rss() -> int:
+    """
+        Returns the peak resident memory of the process in bytes.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class Recorder:
+    """
+       Measures the operations of one scenario.
+    """
+    def __init__(self, name: str, trace_memory: bool = False):
+        """
+            Initialize the recorder.
+
+            Args:
+                name (str): The name of the scenario.
+                trace_memory (bool): Track the peak Python memory with tracemalloc, which slows the scenario down.
+        """
+        self.name = name
+        self.trace_memory = trace_memory
+        self.latencies = []
+        self.items = 0
+        self._started = 0.0
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.elapsed = time.perf_counter() - self._started
+        self.peak_memory = None
+        self.max_rss = get_max_rss()
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    async def measure(self, awaitable, items: int = 1):
+        """
+            Awaits one operation and records its latency.
+
+            Args:
+                awaitable: The operation.
+                items (int): The number of items the operation processes.
+
+            Returns:
+                The result of the operation.
+        """
+        start = time.perf_counter()
+        result = await awaitable
+        self.latencies.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def summary(self) -> dict:
+        """
+            Summarizes the finished scenario.
+
+            Returns:
+                dict: The operation and item counts, elapsed time, throughput, latencies and memory peaks.
+        """
+        return {"operations": len(self.latencies),
+                "items": self.items,
+                "elapsed": round(self.elapsed, 4),
+                "throughput": round(self.items / self.elapsed, 2) if self.elapsed else 0.0,
+                "p50_ms": round(percentile(self.latencies, 0.5) * 1000, 3),
+                "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 3),
+                "peak_memory_mb": round(self.peak_memory / 2 ** 20, 2) if self.trace_memory else None,
+                "max_rss_mb": round(self.max_rss / 2 ** 20, 2)}
+
+
+async def seed_database(user_accounts: list):
+    """
+        Creates the schema and stores the accounts of the synthetic users.
+
+        Args:
+            user_accounts (list): The accounts table rows from data.make_user_accounts.
+    """
+    async with DatabaseManager(DB_NAME) as db:
+        await db.create_tables()
+        await db.apply_migrations()
+        await db.upsert_many(table_name="accounts", rows=user_accounts, key="personal_account")
+
+
+async def bench_sync(google: FakeGoogle, repeat: int, change_share: float, trace_memory: bool = False) -> dict:
+    """
+        Benchmarks the full, staging and incremental spreadsheet synchronization.
+
+        The staging synchronization is measured with a share of the rows changed before every cycle. The
+        incremental synchronization is measured on an empty hash table (cold), with unchanged spreadsheets and
+        with a share of the rows changed before every cycle. The user input mirror is reconciled before the
+        measurements, like the reconciliation job of a running bot does.
+
+        Args:
+            google (FakeGoogle): The Google stand-in with the generated spreadsheets.
+            repeat (int): The number of cycles measured per scenario.
+            change_share (float): The share of rows changed before every changed cycle.
+            trace_memory (bool): Track the peak Python memory.
+
+        Returns:
+            dict: Summaries keyed by scenario name.
+    """
+    rows = len(google.historical_rows)
+    results = {}
+    with google.installed(functions, mirror):
+        await mirror.user_input_mirror.reconcile()
+
+        with Recorder("sync_full", trace_memory) as recorder:
+            for _ in range(repeat):
+                await recorder.measure(functions.sync_accounts_full(), items=rows)
+        results[recorder.name] = recorder.summary()
+
+        with Recorder("sync_staging", trace_memory) as recorder:
+            for cycle in range(repeat):
+                data.mutate_rows(google.historical_rows, share=change_share, seed=repeat + cycle)
+                await recorder.measure(functions.sync_accounts_staging(), items=rows)
+        results[recorder.name] = recorder.summary()
+
+        with Recorder("sync_incremental_cold", trace_memory) as recorder:
+            await recorder.measure(functions.sync_accounts_incremental(), items=rows)
+        results[recorder.name] = recorder.summary()
+
+        with Recorder("sync_incremental_unchanged", trace_memory) as recorder:
+            for _ in range(repeat):
+                await recorder.measure(functions.sync_accounts_incremental(), items=rows)
+        results[recorder.name] = recorder.summary()
+
+        with Recorder("sync_incremental_changed", trace_memory) as recorder:
+            for cycle in range(repeat):
+                data.mutate_rows(google.historical_rows, share=change_share, seed=cycle)
+                google.bump_revision()
+                await recorder.measure(functions.sync_accounts_incremental(), items=rows)
+        results[recorder.name] = recorder.summary()
+
+    return results
+
+
+async def bench_check_data(telegram_ids: list, lookups: int, seed: int = 0, trace_memory: bool = False) -> dict:
+    """
+        Benchmarks DatabaseManager.check_data with the account lookups the handlers make.
+
+        Args:
+            telegram_ids (list): The Telegram IDs of the synthetic users.
+            lookups (int): The number of lookups.
+            seed (int): The seed of the random generator.
+            trace_memory (bool): Track the peak Python memory.
+
+        Returns:
+            dict: Summaries keyed by scenario name.
+    """
+    rng = random.Random(seed)
+    with Recorder("check_data", trace_memory) as recorder:
+        for _ in range(lookups):
+            async with DatabaseManager(DB_NAME) as db:
+                parameters = {"column": "telegram_id",
+                              "value": rng.choice(telegram_ids)}
+                await recorder.measure(db.check_data(table_name="accounts", parameters=parameters))
+
+    return {recorder.name: recorder.summary()}
+
+
+def make_conversation(telegram_id: int) -> list:
+    """
+        Builds the updates of a typical conversation: start, language choice, reading input and going back.
+
+        Args:
+            telegram_id (int): The Telegram ID of the user.
+
+        Returns:
+            list: The updates in the order the user sends them.
+    """
+    buttons = texts.main_menu_buttons_text["ua"]
+    messages = ["/start", texts.first_language, buttons["my_accounts"], texts.back_button_text["ua"],
+                buttons["input_indicator"], "12345.67", texts.back_button_text["ua"]]
+
+    return [make_text_update(telegram_id, text) for text in messages]
+
+
+async def bench_handlers(telegram_ids: list, concurrency: int, taps: int = 3, trace_memory: bool = False) -> dict:
+    """
+        Replays synthetic conversations through the dispatcher with a fake Bot API session.
+
+        Every user sends the updates of a conversation one after another, and up to `concurrency` users are
+        active at the same time, like under polling. The conversations are then replayed by impatient users,
+        who send every update `taps` times at once; with throttling they should cause about as many Bot API
+        requests as the first replay.
+
+        Args:
+            telegram_ids (list): The Telegram IDs of the synthetic users.
+            concurrency (int): The number of users whose conversations are replayed at the same time.
+            taps (int): How many times the impatient users send every update.
+            trace_memory (bool): Track the peak Python memory.
+
+        Returns:
+            dict: Summaries keyed by scenario name, including the number of Bot API requests and the
+            throttled updates.
+    """
+    session = FakeSession()
+    bench_bot = Bot(token=TOKEN, session=session, parse_mode=ParseMode.HTML)
+    semaphore = asyncio.Semaphore(concurrency)
+    conversations = [make_conversation(telegram_id) for telegram_id in telegram_ids]
+
+    async def replay(updates: list):
+        async with semaphore:
+            for update in updates:
+                await recorder.measure(dp.feed_update(bench_bot, update))
+
+    with Recorder("handlers", trace_memory) as recorder:
+        await asyncio.gather(*(replay(updates) for updates in conversations))
+    await dp.storage.flush()
+
+    results = {recorder.name: recorder.summary()}
+    results[recorder.name]["bot_requests"] = session.requests
+
+    impatient = [make_conversation(10 ** 7 + telegram_id) for telegram_id in telegram_ids]
+    throttled_before = THROTTLED_UPDATES.values()
+    requests_before = session.requests
+
+    async def replay_impatiently(updates: list):
+        async with semaphore:
+            for update in updates:
+                await recorder.measure(asyncio.gather(*(dp.feed_update(bench_bot, update) for _ in range(taps))),
+                                       items=taps)
+
+    with Recorder("handlers_impatient", trace_memory) as recorder:
+        await asyncio.gather(*(replay_impatiently(updates) for updates in impatient))
+    await dp.storage.flush()
+
+    results[recorder.name] = recorder.summary()
+    results[recorder.name]["bot_requests"] = session.requests - requests_before
+    results[recorder.name]["throttled"] = {key[0]: value - throttled_before.get(key, 0)
+                                           for key, value in THROTTLED_UPDATES.values().items()}
+    return results
@@ -0,0 +1,148 @@
+"""
+A stand-in for Telegram that POSTs synthetic updates to the webhook server.
+
+Usage:
+    python -m benchmarks.webhook --users 200 --concurrency 20
+    python -m benchmarks.webhook --url http://127.0.0.1:8080/webhook --secret <WEBHOOK_SECRET>
+
+Without --url the webhook server is started in this process with a fake Bot API session and a temporary
+database, and it is stopped with SIGTERM after the run to check that every acknowledged update is processed
+before shutdown. With --url the updates are sent to an already running bot; its answers then go to the real
+Bot API, so use it with a test bot.
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import signal
+import socket
+import time
+
+import aiohttp
+
+from benchmarks import prepare_environment
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.webhook",
+                                     description="POSTs synthetic updates to the webhook server.")
+    parser.add_argument("--url", help="Webhook URL of a running bot. By default a server is started in-process.")
+    parser.add_argument("--secret", help="The WEBHOOK_SECRET of the running bot.")
+    parser.add_argument("--users", type=int, default=200, help="Number of users sending a conversation.")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="Requests in flight, and the update concurrency of the in-process server.")
+
+    return parser.parse_args(argv)
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post_updates(url: str, secret: str, updates: list, concurrency: int) -> dict:
+    """
+        POSTs the updates like Telegram does and measures the time until each one is acknowledged.
+
+        Args:
+            url (str): The webhook URL.
+            secret (str): The secret token sent in the X-Telegram-Bot-Api-Secret-Token header.
+            updates (list): Lists of updates; every list is sent in order, the lists concurrently.
+            concurrency (int): The maximum number of requests in flight.
+
+        Returns:
+            dict: The response status counts, throughput and p50/p99 acknowledgement latency.
+    """
+    from benchmarks.scenarios import percentile
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json={"update_id": 0}, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}) \
+                as response:
+            rejected = response.status == 401
+
+        async def send(conversation: list):
+            async with semaphore:
+                for update in conversation:
+                    start = time.perf_counter()
+                    async with session.post(url, json=update.model_dump(mode="json", exclude_none=True),
+                                            headers=headers) as response:
+                        await response.read()
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(conversation) for conversation in updates))
+        elapsed = time.perf_counter() - start
+
+    return {"wrong_secret_rejected": rejected,
+            "statuses": statuses,
+            "updates": len(latencies),
+            "elapsed": round(elapsed, 4),
+            "throughput": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3)}
+
+
+async def run_in_process(args) -> dict:
+    from aiogram import Bot
+    from aiogram.enums import ParseMode
+
+    from benchmarks.fakes import FakeSession
+    from benchmarks.scenarios import make_conversation, seed_database
+    from bot import handlers  # noqa: F401 (registers the handlers on the dispatcher)
+    from bot.main import dp
+    from bot.settings import DB_NAME, DB_POOL_SIZE, TOKEN
+    from bot.webhook import run_webhook
+    from database.pool import ConnectionPool
+    from database.writer import DatabaseWriter
+
+    secret = secrets.token_urlsafe(16)
+    port = get_free_port()
+    session = FakeSession()
+    webhook_bot = Bot(token=TOKEN, session=session, parse_mode=ParseMode.HTML)
+
+    async with DatabaseWriter(DB_NAME), ConnectionPool(DB_NAME, size=DB_POOL_SIZE):
+        await seed_database(user_accounts=[])
+        server = asyncio.create_task(run_webhook(dispatcher=dp, bot=webhook_bot, host="127.0.0.1", port=port,
+                                                 path="/webhook", secret_token=secret,
+                                                 concurrency=args.concurrency))
+        await asyncio.sleep(0.5)
+
+        conversations = [make_conversation(10 ** 8 + user) for user in range(args.users)]
+        report = await post_updates(f"http://127.0.0.1:{port}/webhook", secret, conversations, args.concurrency)
+
+        os.kill(os.getpid(), signal.SIGTERM)
+        await server
+
+    report["processed_after_shutdown"] = session.requests
+    return report
+
+
+async def run(args) -> dict:
+    if args.url:
+        from benchmarks.scenarios import make_conversation
+
+        conversations = [make_conversation(10 ** 8 + user) for user in range(args.users)]
+        return await post_updates(args.url, args.secret or "", conversations, args.concurrency)
+
+    return await run_in_process(args)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The bot modules read their settings at import time, so they are imported only after this point.
+    prepare_environment()
+
+    for key, value in asyncio.run(run(args)).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+The bot package. STARTED_AT marks the moment the package was first imported and is used to report the
+startup time of the bot.
+"""
+
+import time
+
+
+STARTED_AT = time.perf_counter()
@@ -0,0 +1,172 @@
+"""
+This module contains the Broadcaster class used to send the same kind of message to many users.
+
+Messages are sent by a bounded number of concurrent workers. A global token bucket keeps the bot under
+Telegram's overall sending limit, and a per-chat bucket keeps retries to the same chat apart. Flood-wait
+errors pause every worker for the time Telegram asks for, and other transient errors are retried with
+exponential backoff. Every delivered or permanently failed recipient is recorded in the
+broadcast_deliveries table, so a restarted broadcast with the same ID continues where it stopped. Recipients
+that still hit flood waits or transient errors after the last retry are deferred: they are not recorded, so
+the resumed broadcast sends to them again.
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import (TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+                                TelegramNetworkError, TelegramServerError)
+
+from bot.ratelimit import TokenBucket
+from bot.settings import (DB_NAME, BROADCAST_CONCURRENCY, BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_RATE,
+                          BROADCAST_MAX_RETRIES)
+from database.main import DatabaseManager
+
+
+class Broadcaster:
+    """
+       Sends messages to a list of chats with bounded concurrency, rate limiting, retries and a persisted cursor.
+    """
+    def __init__(self, bot: Bot, broadcast_id: str, concurrency: int = BROADCAST_CONCURRENCY,
+                 global_rate: float = BROADCAST_GLOBAL_RATE, per_chat_rate: float = BROADCAST_PER_CHAT_RATE,
+                 max_retries: int = BROADCAST_MAX_RETRIES):
+        """
+            Initialize the broadcaster.
+
+            Args:
+                bot (Bot): The bot used to send messages.
+                broadcast_id (str): A unique ID of the broadcast, used to resume it after a restart.
+                concurrency (int): The number of messages sent at the same time.
+                global_rate (float): The maximum number of messages per second across all chats.
+                per_chat_rate (float): The maximum number of messages per second to a single chat.
+                max_retries (int): How many times a message is retried after a transient error.
+        """
+        self.bot = bot
+        self.broadcast_id = broadcast_id
+        self.concurrency = concurrency
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(rate=global_rate)
+        self._chat_buckets = {}
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.deferred = 0
+        self.skipped = 0
+
+    async def _get_finished_chats(self):
+        async with DatabaseManager(DB_NAME) as db:
+            parameters = {"column": "broadcast_id",
+                          "value": self.broadcast_id}
+            deliveries = await db.check_data(table_name="broadcast_deliveries", parameters=parameters)
+
+        return {delivery["telegram_id"] for delivery in deliveries or []}
+
+    async def _record(self, chat_id: int, status: str):
+        async with DatabaseManager(DB_NAME) as db:
+            data = {"broadcast_id": self.broadcast_id,
+                    "telegram_id": chat_id,
+                    "status": status}
+            await db.insert_data(table_name="broadcast_deliveries", data=data)
+
+    async def _wait_for_limits(self, chat_id: int):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(rate=self.per_chat_rate, capacity=1)
+        await self._chat_buckets[chat_id].acquire()
+        await self._global_bucket.acquire()
+
+    async def _send(self, chat_id: int, text: str):
+        """
+            Sends one message, retrying transient errors.
+
+            Returns:
+                str: "sent" if the message was delivered, "failed" if it failed permanently, or "deferred" if
+                it still hit flood waits or transient errors after the last retry.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_limits(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return "sent"
+
+            except TelegramRetryAfter as e:
+                logging.error(msg=f"Broadcast {self.broadcast_id}: flood wait of {e.retry_after} seconds")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                logging.error(msg=f"Broadcast {self.broadcast_id}: can't send to {chat_id}: {e}")
+                return "failed"
+
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = min(2 ** attempt, 60)
+                logging.error(msg=f"Broadcast {self.broadcast_id}: error sending to {chat_id}, "
+                                  f"retrying in {delay} seconds: {e}")
+                await asyncio.sleep(delay)
+
+        logging.error(msg=f"Broadcast {self.broadcast_id}: deferring {chat_id} after {self.max_retries} retries")
+        return "deferred"
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id, text = await queue.get()
+            status = "failed"
+            try:
+                status = await self._send(chat_id, text)
+                if status != "deferred":
+                    await self._record(chat_id, status)
+            except Exception as e:
+                logging.error(msg=f"Broadcast {self.broadcast_id}: unexpected error for {chat_id}: {e}")
+            finally:
+                if status == "sent":
+                    self.sent += 1
+                elif status == "deferred":
+                    self.deferred += 1
+                else:
+                    self.failed += 1
+                self._chat_buckets.pop(chat_id, None)
+                queue.task_done()
+
+    async def run(self, recipients: list):
+        """
+            Sends the messages and waits until every recipient is processed.
+
+            Args:
+                recipients (list): A list of (chat_id, text) tuples.
+
+            Returns:
+                dict: The numbers of sent, failed, deferred and skipped messages, the elapsed time and the
+                throughput.
+        """
+        start = time.monotonic()
+        finished_chats = await self._get_finished_chats()
+
+        queue = asyncio.Queue()
+        for chat_id, text in recipients:
+            if chat_id in finished_chats:
+                self.skipped += 1
+            else:
+                queue.put_nowait((chat_id, text))
+
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        elapsed = time.monotonic() - start
+        report = {"sent": self.sent,
+                  "failed": self.failed,
+                  "deferred": self.deferred,
+                  "skipped": self.skipped,
+                  "elapsed": round(elapsed, 2),
+                  "throughput": round(self.sent / elapsed, 2) if elapsed else 0.0}
+        logging.info(msg=f"Broadcast {self.broadcast_id} finished: {report}")
+
+        return report
@@ -0,0 +1,111 @@
+"""
+This module contains the in-process cache of the languages chosen by users.
+
+Every handler needs the user's language before it can answer, so the language is kept in a bounded
+LRU cache with a time-to-live in front of the all_users table. handle_language writes the new choice
+through the cache, so a cached value is never older than the user's last choice made in this process.
+"""
+
+from cachetools import TTLCache
+
+from bot.metrics import CACHE_REQUESTS
+from bot.settings import DB_NAME, LANGUAGE_CACHE_SIZE, LANGUAGE_CACHE_TTL
+from database.main import DatabaseManager
+
+
+class UserLanguageCache:
+    """
+       A bounded LRU cache with TTL that maps telegram_id to the chosen language and counts hits and misses.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        """
+            Initialize the cache.
+
+            Args:
+                maxsize (int): The maximum number of users kept in the cache.
+                ttl (float): Seconds after which a cached language is read from the database again.
+        """
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int):
+        """
+            Returns the cached language of the user.
+
+            Args:
+                telegram_id (int): The Telegram ID of the user.
+
+            Returns:
+                str|None: The cached language or None if it is not cached.
+        """
+        language = self._cache.get(telegram_id)
+        if language is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="user_language", result="miss")
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="user_language", result="hit")
+
+        return language
+
+    def set(self, telegram_id: int, language: str):
+        """
+            Stores the language of the user.
+
+            Args:
+                telegram_id (int): The Telegram ID of the user.
+                language (str): The language chosen by the user.
+        """
+        self._cache[telegram_id] = language
+
+    def invalidate(self, telegram_id: int):
+        """
+            Removes the user from the cache.
+
+            Args:
+                telegram_id (int): The Telegram ID of the user.
+        """
+        self._cache.pop(telegram_id, None)
+
+    def stats(self):
+        """
+            Returns the cache counters.
+
+            Returns:
+                dict: The number of hits, misses and cached users.
+        """
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache)}
+
+
+user_language_cache = UserLanguageCache(maxsize=LANGUAGE_CACHE_SIZE, ttl=LANGUAGE_CACHE_TTL)
+
+
+async def get_user_language(telegram_id: int):
+    """
+        Returns the language chosen by the user, reading all_users only on a cache miss.
+
+        Args:
+            telegram_id (int): The Telegram ID of the user.
+
+        Returns:
+            str|None: The chosen language or None if the user has not chosen one yet.
+    """
+    user_language = user_language_cache.get(telegram_id)
+    if user_language is not None:
+        return user_language
+
+    async with DatabaseManager(DB_NAME) as db:
+        parameters = {"column": "telegram_id",
+                      "value": telegram_id}
+        user_data = await db.check_data(table_name="all_users", parameters=parameters)
+
+    if not user_data:
+        return None
+
+    user_language = user_data[0]["chosen_language"]
+    user_language_cache.set(telegram_id, user_language)
+
+    return user_language
@@ -7,151 +7,394 @@ It utilizes asyncio for asynchronous programming, integrates with Google Sheets
 for data retrieval, and manages SQLite database interactions.
 
 Functions:
+    sync_accounts_full(): Rewrites every account in the database from Google Sheets.
+    sync_accounts_incremental(): Writes only the accounts whose spreadsheet rows changed since the previous cycle.
+    sync_accounts_staging(): Reconciles the accounts with set-based statements over temporary staging tables.
     make_db_updates(): Asynchronously updates the database with new accounts data from Google Sheets.
-    make_notifications(): Sends notifications to all users at a specified hour, 3 days before the end of each month.
-    start_program(): Initializes and starts the execution of the bot, database updates, and notification system.
+    make_notifications(): Sends the month-end reminder to all users.
+    start_program(): Starts the database writer, opens the connection pool and starts the bot and the
+                     scheduler of the database updates and notifications.
 """
 
 
 import time
 import asyncio
-import calendar
+import hashlib
+import functools
 import logging
 
-from google_spreadsheets.functions import get_data_from_sheet
+from google_spreadsheets.functions import (get_data_from_sheet, get_sheet_revision, photo_processor,
+                                           warm_up_google_clients)
+from google_spreadsheets.mirror import user_input_mirror
+from google_spreadsheets.outbox import sheet_outbox
 from datetime import datetime
 from bot.main import bot
 from bot import texts
+from bot.broadcast import Broadcaster
+from bot.metrics import serve_metrics
+from bot.profiler import profiled, profiler
+from bot.scheduler import Scheduler
+from bot.settings import (DB_NAME, DB_POOL_SIZE, DB_POOL_HEALTH_CHECK_INTERVAL, DB_WRITER_COMMIT_WINDOW,
+                          DB_WRITER_MAX_BATCH, SYNC_MODE, SYNC_SCHEDULE, SYNC_MISFIRE_GRACE, NOTIFICATION_SCHEDULE,
+                          NOTIFICATION_MISFIRE_GRACE, USER_INPUT_RECONCILE_SCHEDULE,
+                          USER_INPUT_RECONCILE_MISFIRE_GRACE, METRICS_HOST, METRICS_PORT)
 from database.main import DatabaseManager
+from database.pool import ConnectionPool
+from database.writer import DatabaseWriter
+from database.registry import account_registry
 from bot.handlers import exe_bot
 
 
-logging.basicConfig(filename='logs.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+READING_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y")
 
 
-async def make_db_updates():
+def parse_account_record(record: list):
     """
-        Continuously updates the database with new account data.
+        Converts a row of the historical spreadsheet into an all_accounts record.
 
-        This function fetches data from a Google Sheet, processes it, and updates the
-        database accordingly. It handles exceptions during data processing and logs errors.
-        The function runs in an infinite loop with a delay between each iteration.
+        Args:
+            record (list): The raw row values from the A:J range.
 
-        Raises:
-            Exception: If any error occurs during data processing.
+        Returns:
+            dict: The personal account, address, last indicator and last date of the row.
+    """
+    return {"personal_account": record[7],
+            "address": f"{record[1]}, {record[2]}, {record[3]}, {record[4]}/{record[5]}",
+            "last_indicator": float(record[8].replace("\xa0", "")),
+            "last_date": record[9]}
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_reading_date(value: str):
+    """
+        Converts a date of the spreadsheets into the "YYYY-MM-DD HH:MM:SS" format of the readings ledger.
+
+        The spreadsheet rows share few distinct dates, so the results are cached.
+
+        Args:
+            value (str): The date as written in the spreadsheet, e.g. "31.01.2024" or "2024-01-31 18:30:00".
+
+        Returns:
+            str|None: The normalized date, or None if the format is unknown.
+    """
+    for date_format in READING_DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+
+    return None
+
+
+def get_sheet_readings(records: list):
+    """
+        Converts parsed rows of the historical spreadsheet into readings ledger entries.
+
+        Args:
+            records (list): Records returned by parse_account_record, before the provided indicators are applied.
+
+        Returns:
+            list: The readings of the rows whose date could be read.
+    """
+    readings = []
+    for record in records:
+        date = normalize_reading_date(record["last_date"])
+        if date is None:
+            logging.error(msg=f"Unknown date format of {record}, reading not recorded")
+            continue
+
+        readings.append({"personal_account": record["personal_account"],
+                         "date": date,
+                         "indicator": record["last_indicator"],
+                         "source": "sheet"})
+
+    return readings
+
+
+def get_record_hash(records: list, provided_indicator=None):
+    """
+        Calculates the content hash of all spreadsheet rows of an account together with the indicator provided by
+        the user for it.
+
+        Args:
+            records (list): The raw row values from the A:J range of every row of the account, in sheet order.
+            provided_indicator: The indicator submitted through the bot for this account, if any.
+
+        Returns:
+            str: A hex digest that changes whenever any row of the account or the provided indicator changes.
+    """
+    payload = "\x1d".join("\x1f".join(str(value) for value in record) for record in records)
+    payload += f"\x1e{provided_indicator}"
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+async def get_provided_indicators():
+    """
+        Collects the latest indicator submitted through the bot for every account from the user input mirror.
+
+        Returns:
+            dict: Indicators keyed by personal account.
+    """
+    return await user_input_mirror.read()
+
+
+async def apply_account_records(db: DatabaseManager, records: list, readings: list = None):
     """
+        Writes parsed spreadsheet records to the accounts and all_accounts tables with batched statements.
+
+        Args:
+            db (DatabaseManager): An open database manager.
+            records (list): Parsed records with the provided indicators already applied.
+            readings (list, optional): Readings ledger entries of the spreadsheet rows to record as well.
+    """
+    accounts_to_update = [{"personal_account": record["personal_account"],
+                           "last_indicator": record["last_indicator"]} for record in records]
+
+    await db.update_many(table_name="accounts", rows=accounts_to_update, key="personal_account")
+    await db.upsert_many(table_name="all_accounts", rows=records, key="personal_account",
+                         update_columns=["last_indicator", "last_date"])
+    await db.add_readings(readings=readings)
+    account_registry.add(record["personal_account"] for record in records)
+
+
+async def sync_accounts_full():
+    """
+        Downloads the historical spreadsheet, applies the provided indicators of the user input mirror, rewrites
+        every account in the database and records the rows in the readings ledger.
+    """
+    data = await get_data_from_sheet()
+    clear_data = []
+    for record in data:
+        try:
+            clear_data.append(parse_account_record(record))
+        except Exception as e:
+            logging.error(msg=f"{e} with {record}")
+
+    readings = get_sheet_readings(clear_data)
+    provided_indicators = await get_provided_indicators()
+
+    for clear_record in clear_data:
+        if clear_record["personal_account"] in provided_indicators:
+            clear_record["last_indicator"] = provided_indicators[clear_record["personal_account"]]
+
+    async with DatabaseManager(DB_NAME) as db:
+        await db.run_in_transaction(functools.partial(apply_account_records, records=clear_data, readings=readings))
+
+
+async def sync_accounts_incremental():
+    """
+        Synchronizes only the accounts whose spreadsheet rows changed since the previous cycle.
+
+        The Drive revision of the historical spreadsheet and the version of the user input mirror are compared
+        with the ones stored in the sync_state table, and the download is skipped entirely when neither
+        changed. Otherwise all rows of every account are hashed together with its provided indicator, so an edit
+        of an older row is detected as well, and only accounts whose hash differs from the one stored in
+        sync_row_hashes are parsed and written to the database. All rows of the changed accounts are recorded in
+        the readings ledger.
+    """
+    async with DatabaseManager(DB_NAME) as db:
+        sync_state = {row["key"]: row["value"] for row in await db.get_all_data_from_table(table_name="sync_state")}
+
+    mirror_version = await user_input_mirror.get_version()
+    try:
+        revisions = {"historical_revision": await get_sheet_revision(),
+                     "synced_user_input_mirror_version": mirror_version}
+    except Exception as e:
+        logging.error(msg=f"Can't read spreadsheet revision, falling back to row comparison: {e}")
+        revisions = {}
+
+    if revisions and all(sync_state.get(key) == value for key, value in revisions.items()):
+        logging.info(msg="Spreadsheets unchanged since the previous sync, download skipped")
+        return
+
+    data = await get_data_from_sheet()
+    provided_indicators = await get_provided_indicators()
+
+    latest_records = {}
+    account_rows = {}
+    for record in data:
+        try:
+            latest_records[record[7]] = record
+            account_rows.setdefault(record[7], []).append(record)
+        except Exception as e:
+            logging.error(msg=f"{e} with {record}")
+
+    skipped = changed = inserted = 0
+    changed_records = []
+    changed_rows = []
+    new_hashes = []
+
+    async with DatabaseManager(DB_NAME) as db:
+        known_hashes = {row["personal_account"]: row["row_hash"] for row in
+                        await db.get_all_data_from_table(table_name="sync_row_hashes")}
+
+        for account_number, record in latest_records.items():
+            row_hash = get_record_hash(account_rows[account_number], provided_indicators.get(account_number))
+            if known_hashes.get(account_number) == row_hash:
+                skipped += 1
+                continue
 
-    while True:
-        start = time.time()
-        data = await get_data_from_sheet()
-        clear_data = []
-        for record in data:
             try:
-                account_number = record[7]
-                address = f"{record[1]}, {record[2]}, {record[3]}, {record[4]}/{record[5]}"
-                last_indicator = float(record[8].replace("\xa0", ""))
-                last_date = record[9]
-                account_data = {"personal_account": account_number,
-                                "address": address,
-                                "last_indicator": last_indicator,
-                                "last_date": last_date}
-
-                clear_data.append(account_data)
+                clear_record = parse_account_record(record)
             except Exception as e:
                 logging.error(msg=f"{e} with {record}")
+                continue
 
-        provided_indicators = {}
-        for user_input in await get_data_from_sheet(user_input=True):
-            provided_indicators.update({user_input[1]: user_input[0]})
+            if account_number in provided_indicators:
+                clear_record["last_indicator"] = provided_indicators[account_number]
 
-        async with DatabaseManager("test.db") as db:
-            existing_accounts = [user["personal_account"] for user in
-                                 await db.get_all_data_from_table(table_name="accounts")]
+            if account_number in known_hashes:
+                changed += 1
+            else:
+                inserted += 1
 
-            for clear_record in clear_data:
-                if clear_record["personal_account"] in provided_indicators.keys():
-                    clear_record["last_indicator"] = provided_indicators.get(clear_record["personal_account"])
-                    user_data_to_update = {"last_indicator": clear_record["last_indicator"]}
-                    user_identifier = {"personal_account": clear_record["personal_account"]}
-                    await db.update_data(table_name="accounts", data=user_data_to_update, identifier=user_identifier)
+            changed_records.append(clear_record)
+            changed_rows.extend(account_rows[account_number])
+            new_hashes.append({"personal_account": account_number, "row_hash": row_hash})
 
-                if clear_record["personal_account"] in existing_accounts:
-                    user_data_to_update = {"last_indicator": clear_record["last_indicator"]}
-                    user_identifier = {"personal_account": clear_record["personal_account"]}
-                    await db.update_data(table_name="accounts", data=user_data_to_update, identifier=user_identifier)
-
-                data_to_update = {"last_indicator": clear_record["last_indicator"],
-                                  "last_date": clear_record["last_date"]}
-                identifier = {"personal_account": clear_record["personal_account"]}
+        parsed_rows = []
+        for record in changed_rows:
+            try:
+                parsed_rows.append(parse_account_record(record))
+            except Exception as e:
+                logging.error(msg=f"{e} with {record}")
+        readings = get_sheet_readings(parsed_rows)
 
-                await db.update_data(table_name="all_accounts", data=data_to_update, identifier=identifier)
+        async def write_changes(writer_db: DatabaseManager):
+            await apply_account_records(writer_db, changed_records, readings)
+            await writer_db.upsert_many(table_name="sync_row_hashes", rows=new_hashes, key="personal_account")
+            await writer_db.upsert_many(table_name="sync_state", rows=[{"key": key, "value": value}
+                                                                       for key, value in revisions.items()],
+                                        key="key")
 
-                parameters = {"column": "personal_account",
-                              "value": clear_record["personal_account"]}
+        await db.run_in_transaction(write_changes)
 
-                if not await db.check_data(table_name="all_accounts", parameters=parameters):
-                    await db.insert_data(table_name="all_accounts", data=clear_record)
+    logging.info(msg=f"Incremental sync: {skipped} rows skipped, {changed} changed, {inserted} inserted")
 
-        finish = time.time()
-        logging.info(msg=f"Update done in {round(float(finish - start), 2)} seconds")
 
-        await asyncio.sleep(600)
+async def sync_accounts_staging():
+    """
+        Reconciles the database with the spreadsheets in SQLite instead of in Python.
 
+        The parsed snapshot of the historical spreadsheet and the provided indicators are handed to
+        DatabaseManager.reconcile_accounts, which stages them in temporary tables and applies all changes
+        with set-based statements in one transaction. The rows are then recorded in the readings ledger.
 
-async def make_notifications():
+        Returns:
+            dict: The change summary of the cycle.
     """
-        Sends notifications to all users at a specified hour, three days before the end of each month.
+    data = await get_data_from_sheet()
+    records = []
+    for record in data:
+        try:
+            records.append(parse_account_record(record))
+        except Exception as e:
+            logging.error(msg=f"{e} with {record}")
+
+    readings = get_sheet_readings(records)
+    provided_indicators = await get_provided_indicators()
+
+    async with DatabaseManager(DB_NAME) as db:
+        summary = await db.reconcile_accounts(records=records, overrides=provided_indicators)
+        summary["readings_added"] = await db.add_readings(readings=readings)
+    account_registry.add(record["personal_account"] for record in records)
+
+    logging.info(msg=f"Staging sync: {summary}")
+    return summary
 
-        This function calculates the date three days before the end of the current month and
-        sends notifications to all users at the target hour on that day. It ensures notifications
-        are sent only once by sleeping for an hour after sending the notifications.
-    """
-    target_hour = 19
 
-    while True:
-        current_date = datetime.now()
-        year = current_date.year
-        current_month = current_date.month
+@profiled()
+async def make_db_updates():
+    """
+        Updates the database with new account data.
 
-        cal = calendar.Calendar()
-        initial_month = cal.monthdatescalendar(year, current_month)
+        This function fetches data from Google Sheets, applies the indicators provided through the bot from
+        the local user input mirror, and updates the database accordingly with batched statements in a single
+        transaction. Depending on SYNC_MODE it either rewrites every account, only the ones that changed since
+        the previous cycle, or reconciles them with set-based statements over staging tables. It handles
+        exceptions during data processing and logs errors. It runs as a scheduler job on SYNC_SCHEDULE, and is
+        profiled while the profiler is on.
 
-        all_month_days = []
+        Raises:
+            Exception: If any error occurs during data processing.
+    """
+    start = time.time()
+    if SYNC_MODE == "incremental":
+        await sync_accounts_incremental()
+    elif SYNC_MODE == "staging":
+        await sync_accounts_staging()
+    else:
+        await sync_accounts_full()
 
-        for week in initial_month:
-            for day in week:
-                if day.month == current_month:
-                    all_month_days.append(day)
+    finish = time.time()
+    logging.info(msg=f"Update done in {round(float(finish - start), 2)} seconds")
 
-        target_day = all_month_days[-3]
 
-        if current_date.date() == target_day:
-            logging.info(msg="Today is notification day!")
-            while True:
-                current_minutes = datetime.now().time().hour
-                if current_minutes == target_hour:
-                    logging.info(msg="It's notification time!")
-                    async with DatabaseManager("test.db") as db:
-                        all_users_data = await db.get_all_data_from_table(table_name="all_users")
+async def make_notifications():
+    """
+        Sends the month-end reminder to all users.
 
-                    for user in all_users_data:
-                        await bot.send_message(chat_id=user["telegram_id"],
-                                               text=texts.notification_text[user['chosen_language']])
-                    await asyncio.sleep(3700)
-                    break
-                else:
-                    break
+        This function runs as a scheduler job on NOTIFICATION_SCHEDULE, by default at 19:00 three
+        days before the end of each month. It sends the notifications through a rate-limited
+        Broadcaster whose ID is the current date, so a run resumed after a restart skips users
+        that were already notified. Users who have not chosen a language yet are skipped.
+    """
+    logging.info(msg="It's notification time!")
+    async with DatabaseManager(DB_NAME) as db:
+        all_users_data = await db.get_all_data_from_table(table_name="all_users")
 
-        await asyncio.sleep(600)
+    recipients = [(user["telegram_id"], texts.notification_text[user['chosen_language']])
+                  for user in all_users_data if user['chosen_language'] in texts.notification_text]
+    if len(recipients) < len(all_users_data):
+        logging.info(msg=f"{len(all_users_data) - len(recipients)} users without a chosen language are not notified")
+    broadcaster = Broadcaster(bot=bot, broadcast_id=f"notification-{datetime.now().date().isoformat()}")
+    await broadcaster.run(recipients)
 
 
 async def start_program():
     """
         Initializes and starts the main execution of the bot program.
 
-        This function concurrently runs the bot execution, database updates, and notification
-        system using asyncio's gather method. It is the entry point for starting all major
-        asynchronous tasks in the application.
+        This function starts the database writer, opens the application-wide pool of read connections, creates
+        and migrates the database schema and concurrently runs the bot execution, the scheduler of the database
+        updates, notifications and user input mirror reconciliations, the spreadsheet outbox and the metrics
+        endpoint as tasks. The Google API clients are built in the background meanwhile instead of delaying the
+        start. Once the bot stops after SIGINT or SIGTERM, or the scheduler or the outbox fails, the remaining
+        tasks are cancelled, so the photo workers, the pool and the writer are shut down and the process exits.
+        A failure of the metrics endpoint or of the warm-up is only logged. It is the entry point for starting
+        all major asynchronous tasks in the application.
     """
-    await asyncio.gather(exe_bot(), make_db_updates(), make_notifications())
+    async with DatabaseWriter(DB_NAME, commit_window=DB_WRITER_COMMIT_WINDOW, max_batch=DB_WRITER_MAX_BATCH), \
+            ConnectionPool(DB_NAME, size=DB_POOL_SIZE, health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        async with DatabaseManager(DB_NAME) as db:
+            await db.create_tables()
+            await db.apply_migrations()
+
+        profiler.install_signal_handler()
+        scheduler = Scheduler()
+        scheduler.add_job(name="db_updates", expression=SYNC_SCHEDULE, func=make_db_updates,
+                          misfire_grace=SYNC_MISFIRE_GRACE)
+        scheduler.add_job(name="notifications", expression=NOTIFICATION_SCHEDULE, func=make_notifications,
+                          misfire_grace=NOTIFICATION_MISFIRE_GRACE)
+        scheduler.add_job(name="user_input_reconcile", expression=USER_INPUT_RECONCILE_SCHEDULE,
+                          func=user_input_mirror.reconcile, misfire_grace=USER_INPUT_RECONCILE_MISFIRE_GRACE)
+
+        bot_task = asyncio.create_task(exe_bot())
+        essential = {bot_task, asyncio.create_task(scheduler.run()), asyncio.create_task(sheet_outbox.run())}
+        pending = essential | {asyncio.create_task(warm_up_google_clients()),
+                               asyncio.create_task(serve_metrics(host=METRICS_HOST, port=METRICS_PORT))}
+        try:
+            # The essential tasks run until cancelled, so the program ends when the bot stops or one of them
+            # fails. The warm-up and the metrics endpoint only log their failures.
+            while bot_task in pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task in essential:
+                        task.result()
+                    elif not task.cancelled() and task.exception() is not None:
+                        logging.error(msg=f"Background task failed: {task.exception()}")
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            photo_processor.shutdown()
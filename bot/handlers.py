@@ -2,26 +2,54 @@
 This module contains all the handlers for the bot, defining how it responds to various messages and states.
 It includes functions for language selection, handling the main menu, adding and deleting accounts,
 inputting indicators, confirming actions, and handling initial greetings.
-The module also includes a function to execute the bot, initializing and starting the bot's operations.
+The module also includes the admin /stats command, which reports the collected metrics, the admin /profile
+command, which switches the profiler on and off, and a function to execute the bot, initializing and starting
+the bot's operations.
 """
 
 import re
+import time
 import bot.texts as texts
 import logging
 
+from aiogram import F
+from aiogram.filters import Command
 from aiogram.types import Message
+from bot import STARTED_AT
 from bot.main import dp, bot
+from bot.metrics import format_stats
+from bot.profiler import profiler
+from bot.settings import (DB_NAME, ADMIN_IDS, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST,
+                          WEBHOOK_PORT, WEBHOOK_CONCURRENCY, WEBHOOK_SHUTDOWN_TIMEOUT)
+from bot.webhook import run_webhook
+from bot.cache import get_user_language, user_language_cache
 from aiogram.fsm.context import FSMContext
 from bot.states import UserState
 from bot.keyboards import (get_languages_kb, get_main_menu_kb, get_accounts_kb, get_back_button, get_address_check_kb,
-                           get_single_account_kb, get_confirmation_kb, get_photo_buttons)
+                           get_single_account_kb, get_confirmation_kb, get_photo_buttons, account_keyboard_cache)
 from database.main import DatabaseManager
-from google_spreadsheets.functions import save_data_to_sheet, save_photo
+from database.registry import account_registry
+from google_spreadsheets.functions import save_photo
+from google_spreadsheets.outbox import sheet_outbox
 from datetime import datetime
+from html import escape
 
 
-logging.basicConfig(filename='logs.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+@dp.message(Command("stats"), F.from_user.id.in_(ADMIN_IDS))
+async def handle_stats(message: Message):
+    """Sends the collected metrics to an admin. Registered first, so it works in every state"""
+    await message.answer(text=f"<pre>{escape(format_stats()[:4000])}</pre>")
+
+
+@dp.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def handle_profile(message: Message):
+    """Switches the profiler on or off for an admin. Registered first, so it works in every state"""
+    if profiler.toggle():
+        text = (f"Profiling on: handlers and sync cycles slower than {profiler.threshold} s are written to "
+                f"{profiler.directory}. Send /profile again to stop.")
+    else:
+        text = "Profiling off."
+    await message.answer(text=escape(text))
 
 
 @dp.message(UserState.language_choosing)
@@ -34,7 +62,7 @@ async def handle_language(message: Message, state: FSMContext):
             else:
                 user_language = "ua"
 
-            async with DatabaseManager("test.db") as db:
+            async with DatabaseManager(DB_NAME) as db:
                 parameters = {"column": "telegram_id",
                               "value": message.from_user.id}
                 user_existence = await db.check_data(table_name="all_users", parameters=parameters)
@@ -49,6 +77,8 @@ async def handle_language(message: Message, state: FSMContext):
                     identifier = {"telegram_id": message.from_user.id}
                     await db.update_data(table_name="all_users", data=data, identifier=identifier)
 
+            user_language_cache.set(message.from_user.id, user_language)
+
             await state.clear()
             await state.set_state(UserState.main_menu)
             kb = await get_main_menu_kb(user_language)
@@ -56,24 +86,14 @@ async def handle_language(message: Message, state: FSMContext):
                                  reply_markup=kb)
 
         else:
-            async with DatabaseManager("test.db") as db:
-                parameters = {"column": "telegram_id",
-                              "value": message.from_user.id}
-                user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-            user_language = user_data[0]["chosen_language"]
+            user_language = await get_user_language(message.from_user.id)
             kb = await get_languages_kb()
             await message.answer(text=texts.general_texts[user_language]["choose_action_from_menu"],
                                  reply_markup=kb)
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -86,20 +106,19 @@ async def handle_language(message: Message, state: FSMContext):
 async def handle_main_menu(message: Message, state: FSMContext):
     """Handles all main menu actions"""
     try:
-        async with DatabaseManager("test.db") as db:
+        user_language = await get_user_language(message.from_user.id)
+        async with DatabaseManager(DB_NAME) as db:
             parameters = {"column": "telegram_id",
                           "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
             user_accounts = await db.check_data(table_name="accounts", parameters=parameters)
 
-        user_language = user_data[0]["chosen_language"]
-
         buttons_texts = texts.main_menu_buttons_text[user_language]
 
         if message.text == buttons_texts["my_accounts"]:
             if user_accounts:
                 accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
-                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data)
+                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data,
+                                           telegram_id=message.from_user.id)
                 await state.set_state(UserState.accounts_menu)
                 await message.answer(text=texts.accounts_menu_text[user_language]["account_exists"],
                                      reply_markup=kb)
@@ -132,7 +151,8 @@ async def handle_main_menu(message: Message, state: FSMContext):
 
                 else:
                     accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
-                    kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True)
+                    kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True,
+                                               telegram_id=message.from_user.id)
                     await message.answer(text=texts.general_texts[user_language]["choose_account"],
                                          reply_markup=kb)
                     await state.set_state(UserState.choosing_account)
@@ -149,12 +169,7 @@ async def handle_main_menu(message: Message, state: FSMContext):
                                  reply_markup=kb)
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -167,16 +182,14 @@ async def handle_main_menu(message: Message, state: FSMContext):
 async def handle_account_indicator_choosing(message: Message, state: FSMContext):
     """Handles user's action when user have to choose account to input indicator"""
     try:
-        async with DatabaseManager("test.db") as db:
+        user_language = await get_user_language(message.from_user.id)
+        async with DatabaseManager(DB_NAME) as db:
             parameters = {"column": "telegram_id",
                           "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
             user_accounts = await db.check_data(table_name="accounts", parameters=parameters)
 
         accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
 
-        user_language = user_data[0]["chosen_language"]
-
         if message.text in accounts_data:
             account_number = message.text.split(",")[0]
             filtered_account = filter(lambda item: item['personal_account'] == account_number, user_accounts)
@@ -198,18 +211,14 @@ async def handle_account_indicator_choosing(message: Message, state: FSMContext)
                                  reply_markup=kb)
 
         else:
-            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True)
+            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True,
+                                       telegram_id=message.from_user.id)
             await message.answer(text=texts.general_texts[user_language]["choose_action_from_menu"],
                                  reply_markup=kb)
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -222,13 +231,12 @@ async def handle_account_indicator_choosing(message: Message, state: FSMContext)
 async def handle_accounts_menu_actions(message: Message, state: FSMContext):
     """Handles all actions when user in accounts menu"""
     try:
-        async with DatabaseManager("test.db") as db:
+        user_language = await get_user_language(message.from_user.id)
+        async with DatabaseManager(DB_NAME) as db:
             parameters = {"column": "telegram_id",
                           "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
             user_accounts = await db.check_data(table_name="accounts", parameters=parameters)
 
-        user_language = user_data[0]["chosen_language"]
         accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
 
         if message.text == texts.accounts_buttons_text[user_language]["add"]:
@@ -247,7 +255,8 @@ async def handle_accounts_menu_actions(message: Message, state: FSMContext):
                 await state.set_state(UserState.delete_confirmation)
 
             else:
-                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True)
+                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True,
+                                           telegram_id=message.from_user.id)
                 await message.answer(text=texts.general_texts[user_language]["choose_account_to_delete"],
                                      reply_markup=kb)
                 await state.set_state(UserState.deleting_account)
@@ -263,10 +272,11 @@ async def handle_accounts_menu_actions(message: Message, state: FSMContext):
             await state.set_state(UserState.single_account)
             user_account = message.text
             account_number = user_account.split(",")[0]
-            async with DatabaseManager("test.db") as db:
+            async with DatabaseManager(DB_NAME) as db:
                 parameters = {"column": "personal_account",
                               "value": account_number}
                 account_data = await db.check_data(table_name="accounts", parameters=parameters)
+                consumption = await db.get_monthly_consumption(personal_account=account_number)
 
             last_indicator = round(float(account_data[0]["last_indicator"]), 2)
             last_date = account_data[0]["last_date"]
@@ -277,30 +287,31 @@ async def handle_accounts_menu_actions(message: Message, state: FSMContext):
             text = texts.general_texts[user_language]["choose_action_with_account"].format(user_account,
                                                                                            last_date,
                                                                                            last_indicator)
+            if consumption:
+                months = "\n".join(f"{month['month']}: {round(month['consumption'], 2)}" for month in consumption
+                                   if month["consumption"] is not None)
+                text = f"{text}\n\n{texts.general_texts[user_language]['monthly_consumption']}\n{months}"
             await message.answer(text=text,
                                  reply_markup=kb)
 
         else:
             if not user_accounts:
-                kb = await get_accounts_kb(user_language=user_language)
+                kb = await get_accounts_kb(user_language=user_language,
+                                           telegram_id=message.from_user.id)
                 await message.answer(text=texts.accounts_menu_text[user_language]["no_account"],
                                      reply_markup=kb)
                 await state.clear()
                 await state.set_state(UserState.adding_account)
 
             else:
-                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data)
+                kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data,
+                                           telegram_id=message.from_user.id)
                 await message.answer(text=texts.general_texts[user_language]["choose_action_from_menu"],
                                      reply_markup=kb)
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -314,18 +325,13 @@ async def handle_single_account_actions(message: Message, state: FSMContext):
     """Handles actions when user interacts with single account"""
     try:
         state_data = await state.get_data()
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         if message.text == texts.main_menu_buttons_text[user_language]["input_indicator"]:
             kb = await get_back_button(user_language=user_language)
             user_account = state_data["account_data"]
             account_number = user_account.split(",")[0]
-            async with DatabaseManager("test.db") as db:
+            async with DatabaseManager(DB_NAME) as db:
                 parameters = {"column": "personal_account",
                               "value": account_number}
                 account_data = await db.check_data(table_name="accounts", parameters=parameters)
@@ -358,12 +364,7 @@ async def handle_single_account_actions(message: Message, state: FSMContext):
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -376,13 +377,12 @@ async def handle_single_account_actions(message: Message, state: FSMContext):
 async def handle_account_deleting(message: Message, state: FSMContext):
     """Handles process of account deleting"""
     try:
-        async with DatabaseManager("test.db") as db:
+        user_language = await get_user_language(message.from_user.id)
+        async with DatabaseManager(DB_NAME) as db:
             parameters = {"column": "telegram_id",
                           "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
             user_accounts = await db.check_data(table_name="accounts", parameters=parameters)
 
-        user_language = user_data[0]["chosen_language"]
         accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
 
         if message.text in accounts_data:
@@ -393,23 +393,20 @@ async def handle_account_deleting(message: Message, state: FSMContext):
             await state.set_state(UserState.delete_confirmation)
 
         elif message.text == texts.back_button_text[user_language]:
-            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data)
+            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data,
+                                       telegram_id=message.from_user.id)
             await state.set_state(UserState.accounts_menu)
             await message.answer(text=texts.accounts_menu_text[user_language]["account_exists"],
                                  reply_markup=kb)
 
         else:
-            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True)
+            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data, indicator=True,
+                                       telegram_id=message.from_user.id)
             await message.answer(text=texts.general_texts[user_language]["choose_action_from_menu"],
                                  reply_markup=kb)
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -422,21 +419,21 @@ async def handle_account_deleting(message: Message, state: FSMContext):
 async def handle_delete_confirmation(message: Message, state: FSMContext):
     """Handles confirmation of deleting account"""
     try:
-        async with DatabaseManager("test.db") as db:
+        user_language = await get_user_language(message.from_user.id)
+        async with DatabaseManager(DB_NAME) as db:
             parameters = {"column": "telegram_id",
                           "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
             user_accounts = await db.check_data(table_name="accounts", parameters=parameters)
 
-        user_language = user_data[0]["chosen_language"]
         state_data = await state.get_data()
         account_number = state_data["account_data"].split(",")[0]
 
         if message.text == texts.confirming_buttons[user_language]["yes"]:
-            async with DatabaseManager("test.db") as db:
+            async with DatabaseManager(DB_NAME) as db:
                 parameters = {"column": "personal_account",
                               "value": account_number}
                 await db.delete_from_db(table_name="accounts", parameters=parameters)
+            account_keyboard_cache.invalidate(message.from_user.id)
 
             kb = await get_main_menu_kb(user_language)
             text = (f"{texts.general_texts[user_language]['account_deleted']}\n\n"
@@ -448,7 +445,8 @@ async def handle_delete_confirmation(message: Message, state: FSMContext):
 
         elif message.text == texts.confirming_buttons[user_language]["no"]:
             accounts_data = [f"{account['personal_account']}, {account['address']}" for account in user_accounts]
-            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data)
+            kb = await get_accounts_kb(user_language=user_language, user_accounts=accounts_data,
+                                       telegram_id=message.from_user.id)
             await state.set_state(UserState.accounts_menu)
             await message.answer(text=texts.accounts_menu_text[user_language]["account_exists"],
                                  reply_markup=kb)
@@ -466,12 +464,7 @@ async def handle_delete_confirmation(message: Message, state: FSMContext):
                                  reply_markup=kb)
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -484,12 +477,7 @@ async def handle_delete_confirmation(message: Message, state: FSMContext):
 async def handle_indicator_adding(message: Message, state: FSMContext):
     """Handles indicator adding process"""
     try:
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
         indicator_pattern = "^\d+(\.\d{1,2})?$"
         if message.text == texts.back_button_text[user_language]:
             await state.clear()
@@ -529,12 +517,7 @@ async def handle_indicator_adding(message: Message, state: FSMContext):
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -547,12 +530,7 @@ async def handle_indicator_adding(message: Message, state: FSMContext):
 async def handle_indicator_confirmation(message: Message, state: FSMContext):
     """Handles confirming indicator value"""
     try:
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         if message.text == texts.confirming_buttons[user_language]["yes"]:
             state_data = await state.get_data()
@@ -587,12 +565,7 @@ async def handle_indicator_confirmation(message: Message, state: FSMContext):
                                  reply_markup=kb)
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -605,12 +578,7 @@ async def handle_indicator_confirmation(message: Message, state: FSMContext):
 async def handle_photo(message: Message, state: FSMContext):
     """Handles photo uploading"""
     try:
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         if message.photo or message.text == texts.skip_text[user_language]:
             state_data = await state.get_data()
@@ -632,12 +600,22 @@ async def handle_photo(message: Message, state: FSMContext):
                              message.from_user.id,
                              time_of_indicator,
                              photo_link]
-            await save_data_to_sheet(data=data_to_sheet)
-            async with DatabaseManager("test.db") as db:
+
+            async def record_reading(db: DatabaseManager):
                 identifier = {"personal_account": account_number}
                 data = {"last_date": time_of_indicator,
                         "last_indicator": current_indicator}
                 await db.update_data(table_name="accounts", data=data, identifier=identifier)
+                reading = {"personal_account": account_number,
+                           "date": time_of_indicator,
+                           "indicator": current_indicator,
+                           "source": "bot",
+                           "telegram_id": message.from_user.id,
+                           "photo_link": photo_link if message.photo else None}
+                await db.add_readings(readings=[reading])
+
+            # The outbox row, the account and the readings ledger are committed in one transaction.
+            await sheet_outbox.enqueue(row=data_to_sheet, changes=record_reading)
 
             kb = await get_main_menu_kb(user_language)
             text = (f"{texts.general_texts[user_language]['indicator_added']}\n\n"
@@ -664,12 +642,7 @@ async def handle_photo(message: Message, state: FSMContext):
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -682,15 +655,7 @@ async def handle_photo(message: Message, state: FSMContext):
 async def handle_account_adding(message: Message, state: FSMContext):
     """Handles account adding"""
     try:
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-            all_accounts = await db.get_all_data_from_table(table_name="all_accounts")
-
-        all_accounts_numbers = [record["personal_account"] for record in all_accounts]
-        user_language = user_data[0]["chosen_language"]
-
+        user_language = await get_user_language(message.from_user.id)
         account_number_pattern = "^\d{7}$"
 
         if message.text == texts.back_button_text[user_language]:
@@ -701,17 +666,17 @@ async def handle_account_adding(message: Message, state: FSMContext):
                                  reply_markup=kb)
 
         elif re.match(account_number_pattern, message.text):
-            if message.text in all_accounts_numbers:
-                async with DatabaseManager("test.db") as db:
+            account = await account_registry.get_account(message.text)
+            if account:
+                async with DatabaseManager(DB_NAME) as db:
                     parameters = {"column": "personal_account",
                                   "value": message.text}
                     already_exists = await db.check_data(table_name="accounts", parameters=parameters)
                     if already_exists:
                         await db.delete_from_db(table_name="accounts", parameters=parameters)
+                        account_keyboard_cache.invalidate(already_exists[0]["telegram_id"])
 
                 kb = await get_address_check_kb(user_language)
-                filtered_account = filter(lambda item: item['personal_account'] == message.text, all_accounts)
-                account = next(filtered_account)
                 address = account["address"]
                 last_indicator = account["last_indicator"]
                 last_date = account["last_date"]
@@ -744,12 +709,7 @@ async def handle_account_adding(message: Message, state: FSMContext):
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -762,16 +722,11 @@ async def handle_account_adding(message: Message, state: FSMContext):
 async def address_check_handler(message: Message, state: FSMContext):
     """Handles actions with address check"""
     try:
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         if message.text == texts.address_verification_buttons_text[user_language]:
             user_state_data = await state.get_data()
-            async with DatabaseManager("test.db") as db:
+            async with DatabaseManager(DB_NAME) as db:
                 data = {"telegram_id": message.from_user.id,
                         "personal_account": user_state_data["account_number"],
                         "address": user_state_data["address"],
@@ -779,6 +734,7 @@ async def address_check_handler(message: Message, state: FSMContext):
                         "last_date": user_state_data["last_date"]}
 
                 await db.insert_data(table_name="accounts", data=data)
+            account_keyboard_cache.invalidate(message.from_user.id)
 
             text = (f"{texts.general_texts[user_language]['account_added']}\n\n"
                     f"{texts.general_texts[user_language]['main_menu']}")
@@ -804,12 +760,7 @@ async def address_check_handler(message: Message, state: FSMContext):
 
     except Exception as e:
         logging.error(msg=f"An error occurred: {e}")
-        async with DatabaseManager("test.db") as db:
-            parameters = {"column": "telegram_id",
-                          "value": message.from_user.id}
-            user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-        user_language = user_data[0]["chosen_language"]
+        user_language = await get_user_language(message.from_user.id)
 
         await state.clear()
         await state.set_state(UserState.main_menu)
@@ -821,14 +772,9 @@ async def address_check_handler(message: Message, state: FSMContext):
 @dp.message()
 async def handle_greeting(message: Message, state: FSMContext):
     """General handler for initial message"""
-    async with DatabaseManager("test.db") as db:
-        parameters = {"column": "telegram_id",
-                      "value": message.from_user.id}
-        user_data = await db.check_data(table_name="all_users", parameters=parameters)
-
-    if user_data:
-        user_language = user_data[0]["chosen_language"]
+    user_language = await get_user_language(message.from_user.id)
 
+    if user_language:
         kb = await get_main_menu_kb(user_language)
         await message.answer(text=texts.general_texts[user_language]['main_menu'],
                              reply_markup=kb)
@@ -844,13 +790,15 @@ async def handle_greeting(message: Message, state: FSMContext):
 
 async def exe_bot():
     """
-        Initializes and starts the bot. It ensures the necessary tables are created in the database
-        and starts the bot's polling mechanism.
+        Initializes and starts receiving updates, with long polling or with a webhook server depending on
+        BOT_MODE. The database schema is prepared by start_program before the bot is started.
     """
-    async with DatabaseManager("test.db") as db:
-        await db.create_tables()
-
-    logging.info(msg="BOT started")
+    logging.info(msg=f"BOT started in {round(time.perf_counter() - STARTED_AT, 2)} seconds")
     print("BOT started")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    if BOT_MODE == "webhook":
+        await run_webhook(dispatcher=dp, bot=bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                          secret_token=WEBHOOK_SECRET, url=WEBHOOK_URL, concurrency=WEBHOOK_CONCURRENCY,
+                          shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT)
+    else:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
@@ -2,15 +2,24 @@
 This module contains functions to generate various keyboards (sets of buttons) for the bot interface.
 Each function returns a specific type of keyboard layout to be used in different contexts within the bot,
 such as selecting languages, navigating the main menu, managing accounts, and confirming actions.
+
+Building a keyboard validates a pydantic model for every button, so keyboards are built once and reused.
+The keyboards that depend only on the language are built for every language when the module is imported.
+Account keyboards are cached per user, language and mode together with the accounts they were built from, and
+are built again when the user's accounts differ; adding or deleting an account evicts the user's keyboards.
 """
 
 
 from aiogram.utils.keyboard import KeyboardButton, ReplyKeyboardMarkup
+from cachetools import LRUCache
+
+from bot.metrics import CACHE_REQUESTS
+from bot.settings import KEYBOARD_CACHE_SIZE
 from bot.texts import (first_language, second_language, main_menu_buttons_text, accounts_buttons_text, back_button_text,
                        address_verification_buttons_text, confirming_buttons, skip_text)
 
 
-async def get_languages_kb():
+def _build_languages_kb():
     """
     Generates a keyboard with language selection buttons.
 
@@ -25,7 +34,7 @@ async def get_languages_kb():
     return kb
 
 
-async def get_main_menu_kb(user_language: str):
+def _build_main_menu_kb(user_language: str):
     """
      Generates the main menu keyboard based on the user's selected language.
 
@@ -52,7 +61,7 @@ async def get_main_menu_kb(user_language: str):
     return kb
 
 
-async def get_accounts_kb(user_language: str, user_accounts: list = None, indicator: bool = False):
+def _build_accounts_kb(user_language: str, user_accounts: list = None, indicator: bool = False):
     """
     Generates a keyboard for account management, including options for adding, deleting, and selecting accounts.
 
@@ -92,7 +101,7 @@ async def get_accounts_kb(user_language: str, user_accounts: list = None, indica
     return kb
 
 
-async def get_back_button(user_language: str):
+def _build_back_button(user_language: str):
     """
     Generates a keyboard with a 'Back' button in the user's selected language.
 
@@ -109,7 +118,7 @@ async def get_back_button(user_language: str):
     return kb
 
 
-async def get_address_check_kb(user_language: str):
+def _build_address_check_kb(user_language: str):
     """
     Generates a keyboard for address verification with confirmation buttons.
 
@@ -132,7 +141,7 @@ async def get_address_check_kb(user_language: str):
     return kb
 
 
-async def get_single_account_kb(user_language: str):
+def _build_single_account_kb(user_language: str):
     """
     Generates a keyboard for single account actions like inputting indicators or deleting the account.
 
@@ -157,7 +166,7 @@ async def get_single_account_kb(user_language: str):
     return kb
 
 
-async def get_confirmation_kb(user_language: str):
+def _build_confirmation_kb(user_language: str):
     """
     Generates a confirmation keyboard with 'Yes' and 'No' options in the user's selected language.
 
@@ -182,7 +191,7 @@ async def get_confirmation_kb(user_language: str):
     return kb
 
 
-async def get_photo_buttons(user_language: str):
+def _build_photo_buttons(user_language: str):
     """
         Generates a keyboard for handling photo uploads, offering options to skip or return to the main menu.
 
@@ -204,3 +213,145 @@ async def get_photo_buttons(user_language: str):
     kb = ReplyKeyboardMarkup(keyboard=buttons, is_persistent=True, resize_keyboard=True)
 
     return kb
+
+
+_STATIC_BUILDERS = {"main_menu": _build_main_menu_kb,
+                    "back": _build_back_button,
+                    "address_check": _build_address_check_kb,
+                    "single_account": _build_single_account_kb,
+                    "confirmation": _build_confirmation_kb,
+                    "photo": _build_photo_buttons}
+
+_static_keyboards = {}
+
+
+def build_static_keyboards():
+    """
+        Builds the keyboards that depend only on the language, for every language of the texts.
+    """
+    _static_keyboards["languages"] = _build_languages_kb()
+    for language in back_button_text:
+        for name, builder in _STATIC_BUILDERS.items():
+            _static_keyboards[(name, language)] = builder(language)
+
+
+def _get_static_kb(name: str, user_language: str):
+    kb = _static_keyboards.get((name, user_language))
+    if kb is None:
+        kb = _static_keyboards[(name, user_language)] = _STATIC_BUILDERS[name](user_language)
+
+    return kb
+
+
+class AccountKeyboardCache:
+    """
+       A bounded cache of account keyboards keyed by user, language and mode.
+    """
+    def __init__(self, maxsize: int):
+        """
+            Initialize the cache.
+
+            Args:
+                maxsize (int): The maximum number of keyboards kept in the cache.
+        """
+        self._keyboards = LRUCache(maxsize=maxsize)
+
+    def get(self, telegram_id: int, user_language: str, user_accounts: list = None, indicator: bool = False):
+        """
+            Returns the account keyboard of the user, building it on a cache miss.
+
+            Args:
+                telegram_id (int): The Telegram ID of the user.
+                user_language (str): The language selected by the user.
+                user_accounts (list, optional): The account buttons of the user. Defaults to None.
+                indicator (bool, optional): Flag to indicate if the keyboard is for indicator input.
+
+            Returns:
+                ReplyKeyboardMarkup: A keyboard markup for account management.
+        """
+        key = (telegram_id, user_language, indicator)
+        accounts = tuple(user_accounts or ())
+        cached = self._keyboards.get(key)
+        # The accounts are compared too, because an account can also be taken over by another user.
+        if cached is not None and cached[0] == accounts:
+            CACHE_REQUESTS.inc(cache="accounts_keyboard", result="hit")
+            return cached[1]
+
+        CACHE_REQUESTS.inc(cache="accounts_keyboard", result="miss")
+        kb = _build_accounts_kb(user_language=user_language, user_accounts=user_accounts, indicator=indicator)
+        self._keyboards[key] = (accounts, kb)
+
+        return kb
+
+    def invalidate(self, telegram_id: int):
+        """
+            Removes the cached keyboards of the user, so they are built again from the user's accounts.
+
+            Args:
+                telegram_id (int): The Telegram ID of the user.
+        """
+        for user_language in back_button_text:
+            for indicator in (False, True):
+                self._keyboards.pop((telegram_id, user_language, indicator), None)
+
+
+account_keyboard_cache = AccountKeyboardCache(maxsize=KEYBOARD_CACHE_SIZE)
+
+
+async def get_languages_kb():
+    """Returns the language selection keyboard."""
+    return _static_keyboards["languages"]
+
+
+async def get_main_menu_kb(user_language: str):
+    """Returns the main menu keyboard of the language."""
+    return _get_static_kb("main_menu", user_language)
+
+
+async def get_accounts_kb(user_language: str, user_accounts: list = None, indicator: bool = False,
+                          telegram_id: int = None):
+    """
+        Returns the account management keyboard, from the cache of the user if telegram_id is given.
+
+        Args:
+            user_language (str): The language selected by the user.
+            user_accounts (list, optional): A list of user accounts. Defaults to None.
+            indicator (bool, optional): Flag to indicate if the keyboard is for indicator input. Defaults to False.
+            telegram_id (int, optional): The Telegram ID of the user whose accounts are shown.
+
+        Returns:
+            ReplyKeyboardMarkup: A keyboard markup for account management.
+    """
+    if telegram_id is None:
+        return _build_accounts_kb(user_language=user_language, user_accounts=user_accounts, indicator=indicator)
+
+    return account_keyboard_cache.get(telegram_id=telegram_id, user_language=user_language,
+                                      user_accounts=user_accounts, indicator=indicator)
+
+
+async def get_back_button(user_language: str):
+    """Returns the keyboard with a 'Back' button of the language."""
+    return _get_static_kb("back", user_language)
+
+
+async def get_address_check_kb(user_language: str):
+    """Returns the address verification keyboard of the language."""
+    return _get_static_kb("address_check", user_language)
+
+
+async def get_single_account_kb(user_language: str):
+    """Returns the single account actions keyboard of the language."""
+    return _get_static_kb("single_account", user_language)
+
+
+async def get_confirmation_kb(user_language: str):
+    """Returns the 'Yes'/'No' confirmation keyboard of the language."""
+    return _get_static_kb("confirmation", user_language)
+
+
+async def get_photo_buttons(user_language: str):
+    """Returns the photo upload keyboard of the language."""
+    return _get_static_kb("photo", user_language)
+
+
+build_static_keyboards()
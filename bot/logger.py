@@ -0,0 +1,85 @@
+"""
+This module configures the application logging so the event loop never blocks on log I/O.
+
+Log records are put on an in-memory queue by a QueueHandler attached to the root logger. A QueueListener
+thread takes them from the queue and writes them to a size-rotated log file. Every record is enriched with
+the structured fields of the update being handled (telegram_id, state, handler and duration), which
+LoggingContextMiddleware sets in context variables. Records logged outside of an update carry "-" instead.
+Records of level ERROR and above are also counted in the bot_logged_errors_total metric.
+"""
+
+import atexit
+import contextvars
+import logging
+import queue
+
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from bot.metrics import ErrorCountingHandler
+
+
+LOG_FORMAT = ('%(asctime)s - %(levelname)s - %(message)s - '
+              'telegram_id=%(telegram_id)s state=%(state)s handler=%(handler)s duration=%(duration)s')
+
+telegram_id_var = contextvars.ContextVar("telegram_id", default="-")
+state_var = contextvars.ContextVar("state", default="-")
+handler_var = contextvars.ContextVar("handler", default="-")
+duration_var = contextvars.ContextVar("duration", default="-")
+
+_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """
+       Copies the structured fields of the current update from the context variables to every log record.
+    """
+    def filter(self, record):
+        record.telegram_id = telegram_id_var.get()
+        record.state = state_var.get()
+        record.handler = handler_var.get()
+        record.duration = duration_var.get()
+        return True
+
+
+def setup_logging(filename: str = 'logs.log', level: int = logging.INFO, max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5):
+    """
+        Routes all logging through a queue to a background thread writing a rotating log file.
+
+        Calling it again has no effect.
+
+        Args:
+            filename (str): The path of the log file.
+            level (int): The minimum level of the logged records.
+            max_bytes (int): The size in bytes at which the log file is rotated.
+            backup_count (int): The number of rotated log files kept.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    root.addHandler(ErrorCountingHandler())
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+        Writes out the queued records and stops the background logging thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
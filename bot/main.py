@@ -1,7 +1,7 @@
 """
 This module initializes the core components necessary for the operation of an Aiogram-based Telegram bot.
 It sets up the bot with the provided API token, configures the parsing mode for messages, and initializes
-the dispatcher with memory storage for managing the state of conversations.
+the dispatcher with SQLite-backed storage for managing the state of conversations.
 
 The Aiogram library is utilized here to create the bot and dispatcher objects. The bot token is sourced
 from the 'bot.settings' module. Additionally, the module configures the bot to parse messages in HTML format,
@@ -11,20 +11,32 @@ Imports:
     - Aiogram: A library for Telegram Bot API.
     - TOKEN: A variable containing the bot's API token.
     - ParseMode: Enum to specify the message parsing mode.
-    - MemoryStorage: A storage class for maintaining the state in memory.
+    - SQLiteStorage: A storage class for maintaining the state in the SQLite database.
 
 Variables:
-    - storage: An instance of MemoryStorage to store user state and data.
+    - storage: An instance of SQLiteStorage to store user state and data.
     - bot: The bot instance created with the TOKEN and HTML parsing mode.
-    - dp: The Dispatcher instance, linked with the bot and the storage for handling updates.
+    - dp: The Dispatcher instance, linked with the bot and the storage for handling updates. UserEventIsolation
+      makes it handle the updates of a user one at a time, with the state loaded after the previous update
+      finished. Every update then passes ThrottlingMiddleware, which drops rapid identical repeats and limits
+      the rate per user. Message handlers run through LoggingContextMiddleware, which adds
+      the structured fields of every update to its log records, MetricsMiddleware, which times them per
+      handler and state, and ProfilingMiddleware, which samples their stacks while the profiler is on.
 """
 
 
 from aiogram import Bot, Dispatcher
-from bot.settings import TOKEN
+from bot.settings import (TOKEN, DB_NAME, FSM_CACHE_SIZE, FSM_TTL, FSM_FLUSH_INTERVAL, THROTTLE_RATE, THROTTLE_BURST,
+                          THROTTLE_DUPLICATE_WINDOW)
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
+from bot.storage import SQLiteStorage, UserEventIsolation
+from bot.middlewares import LoggingContextMiddleware, MetricsMiddleware, ProfilingMiddleware, ThrottlingMiddleware
 
-storage = MemoryStorage()
+storage = SQLiteStorage(DB_NAME, cache_size=FSM_CACHE_SIZE, ttl=FSM_TTL, flush_interval=FSM_FLUSH_INTERVAL)
 bot = Bot(token=TOKEN, parse_mode=ParseMode.HTML)
-dp = Dispatcher(storage=storage)
+dp = Dispatcher(storage=storage, events_isolation=UserEventIsolation())
+dp.update.outer_middleware(ThrottlingMiddleware(rate=THROTTLE_RATE, burst=THROTTLE_BURST,
+                                                duplicate_window=THROTTLE_DUPLICATE_WINDOW))
+dp.message.middleware(LoggingContextMiddleware())
+dp.message.middleware(MetricsMiddleware())
+dp.message.middleware(ProfilingMiddleware())
@@ -0,0 +1,355 @@
+"""
+This module contains the in-process metrics of the bot and the HTTP endpoint that exposes them.
+
+Handlers, DatabaseManager methods, Google API calls and scheduler jobs are timed into histograms, and errors
+and cache lookups are counted. The metrics are rendered in the Prometheus text exposition format by a small
+aiohttp server that runs on the bot's event loop, and summarized for admins by the /stats command.
+
+The module has no dependencies on the rest of the bot, so every package can import it.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+
+from collections import defaultdict
+
+from aiohttp import web
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+       A monotonically increasing value per label set.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+            Initialize the counter.
+
+            Args:
+                name (str): The metric name.
+                documentation (str): The help text of the metric.
+                labelnames (tuple): The names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        """
+            Increases the counter of the label set.
+
+            Args:
+                value (float): The increment.
+                **labels: The label values.
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] += value
+
+    def values(self) -> dict:
+        """
+            Returns the current values.
+
+            Returns:
+                dict: Values keyed by the tuple of label values.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def collect(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self.values().items()]
+
+
+class Histogram:
+    """
+       A distribution of observed durations per label set, with cumulative buckets, a sum and a count.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        """
+            Initialize the histogram.
+
+            Args:
+                name (str): The metric name.
+                documentation (str): The help text of the metric.
+                labelnames (tuple): The names of the labels.
+                buckets (tuple): The increasing upper bounds of the buckets in seconds.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        """
+            Records an observation of the label set.
+
+            Args:
+                value (float): The observed value in seconds.
+                **labels: The label values.
+        """
+        key = tuple(labels[name] for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["buckets"][index] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    def values(self) -> dict:
+        """
+            Returns the sum and count of every label set.
+
+            Returns:
+                dict: {"sum", "count"} dicts keyed by the tuple of label values.
+        """
+        return {key: {"sum": series["sum"], "count": series["count"]} for key, series in self._series.items()}
+
+    def collect(self) -> list:
+        lines = []
+        for key, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+
+        return lines
+
+
+class Gauge:
+    """
+       A value per label set that is read from a callback when the metrics are rendered.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple, callback):
+        """
+            Initialize the gauge.
+
+            Args:
+                name (str): The metric name.
+                documentation (str): The help text of the metric.
+                labelnames (tuple): The names of the labels.
+                callback: A function without arguments returning values keyed by the tuple of label values.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def values(self) -> dict:
+        return self.callback()
+
+    def collect(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self.values().items()]
+
+
+class MetricsRegistry:
+    """
+       The collection of metrics rendered by the endpoint and the /stats command.
+    """
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """
+            Adds a metric to the registry.
+
+            Args:
+                metric (Counter|Histogram|Gauge): The metric.
+
+            Returns:
+                The registered metric.
+        """
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+            Renders all metrics in the Prometheus text exposition format.
+
+            Returns:
+                str: The exposition text.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HANDLER_DURATION = registry.register(Histogram("bot_handler_duration_seconds", "Time spent in message handlers.",
+                                               ("handler", "state")))
+HANDLER_ERRORS = registry.register(Counter("bot_handler_errors_total", "Exceptions raised by message handlers.",
+                                           ("handler", "state")))
+DB_DURATION = registry.register(Histogram("bot_db_duration_seconds", "Time spent in DatabaseManager methods.",
+                                          ("method",)))
+DB_ERRORS = registry.register(Counter("bot_db_errors_total", "Exceptions raised by DatabaseManager methods.",
+                                      ("method",)))
+GOOGLE_DURATION = registry.register(Histogram("bot_google_duration_seconds", "Time spent in Google API calls.",
+                                              ("function",)))
+GOOGLE_ERRORS = registry.register(Counter("bot_google_errors_total", "Failed Google API calls.", ("function",)))
+DB_WRITER_BATCH = registry.register(Histogram("bot_db_writer_batch_size", "Write requests committed per transaction.",
+                                              buckets=(1, 2, 5, 10, 25, 50, 100, 250)))
+PHOTO_BYTES_SAVED = registry.register(Histogram("bot_photo_bytes_saved",
+                                                "Bytes saved per photo upload compared with the largest size.",
+                                                ("method",), buckets=(0, 10 ** 4, 5 * 10 ** 4, 10 ** 5, 2.5 * 10 ** 5,
+                                                                      5 * 10 ** 5, 10 ** 6, 2.5 * 10 ** 6)))
+JOB_DURATION = registry.register(Histogram("bot_job_duration_seconds", "Time spent in scheduler jobs.", ("job",)))
+LOGGED_ERRORS = registry.register(Counter("bot_logged_errors_total", "Log records of level ERROR and above.",
+                                          ("level",)))
+THROTTLED_UPDATES = registry.register(Counter("bot_throttled_updates_total",
+                                              "Updates dropped by the throttling middleware.",
+                                              ("reason",)))
+CACHE_REQUESTS = registry.register(Counter("bot_cache_requests_total", "Cache lookups by result.",
+                                           ("cache", "result")))
+
+
+def timed(histogram: Histogram, errors: Counter = None, label: str = "function"):
+    """
+        Decorates a coroutine function to observe its duration and count its exceptions.
+
+        Args:
+            histogram (Histogram): The histogram receiving the durations.
+            errors (Counter): The counter of exceptions, if any.
+            label (str): The name of the label set to the name of the decorated function.
+
+        Returns:
+            The decorator.
+    """
+    def decorator(func):
+        labels = {label: func.__name__}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+class ErrorCountingHandler(logging.Handler):
+    """
+       A logging handler that counts the records of level ERROR and above, including the errors handlers catch.
+    """
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        LOGGED_ERRORS.inc(level=record.levelname)
+
+
+def format_stats(limit: int = 10) -> str:
+    """
+        Summarizes the metrics for the /stats command.
+
+        Histograms are listed by total time spent, with the call count and the average duration, and counters
+        are listed with their totals.
+
+        Args:
+            limit (int): The maximum number of label sets listed per histogram.
+
+        Returns:
+            str: The summary as plain text.
+    """
+    lines = []
+    for metric in registry.metrics.values():
+        values = metric.values()
+        if not values:
+            continue
+
+        lines.append(metric.name)
+        if isinstance(metric, Histogram) and not metric.name.endswith("_seconds"):
+            for key, series in list(values.items())[:limit]:
+                average = series["sum"] / series["count"] if series["count"] else 0.0
+                lines.append(f"  {' '.join(map(str, key)) or '-'}: {series['count']} observations, avg {average:.1f}")
+        elif isinstance(metric, Histogram):
+            ordered = sorted(values.items(), key=lambda item: item[1]["sum"], reverse=True)
+            for key, series in ordered[:limit]:
+                average = series["sum"] / series["count"] * 1000 if series["count"] else 0.0
+                lines.append(f"  {' '.join(map(str, key)) or '-'}: {series['count']} calls, "
+                             f"avg {average:.1f} ms, total {series['sum']:.1f} s")
+        else:
+            for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+                lines.append(f"  {' '.join(map(str, key)) or '-'}: {value:g}")
+
+    return "\n".join(lines) or "No metrics collected yet"
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def serve_metrics(host: str, port: int):
+    """
+        Serves the metrics at /metrics on the running event loop until cancelled.
+
+        The endpoint is optional, so an address that can't be listened on is logged and the bot keeps running
+        without it.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on. 0 disables the endpoint.
+    """
+    if not port:
+        return
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            logging.error(msg=f"Can't serve the metrics at {host}:{port}: {e}")
+            return
+
+        logging.info(msg=f"Metrics served at http://{host}:{port}/metrics")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,238 @@
+"""
+This module contains the middlewares registered on the dispatcher.
+"""
+
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from bot.cache import get_user_language
+from bot.logger import telegram_id_var, state_var, handler_var, duration_var
+from bot.metrics import HANDLER_DURATION, HANDLER_ERRORS, THROTTLED_UPDATES
+from bot.profiler import profiler
+from bot.ratelimit import TokenBucket
+from bot.texts import general_texts
+
+
+class LoggingContextMiddleware(BaseMiddleware):
+    """
+       Sets the structured logging fields for the handled update and logs how long its handler took.
+    """
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        handler_object = data.get("handler")
+        tokens = [(telegram_id_var, telegram_id_var.set(user.id if user else "-")),
+                  (state_var, state_var.set(data.get("raw_state") or "-")),
+                  (handler_var, handler_var.set(handler_object.callback.__name__ if handler_object else "-"))]
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            tokens.append((duration_var, duration_var.set(round(time.perf_counter() - start, 4))))
+            logging.info(msg="Update handled")
+            for variable, token in reversed(tokens):
+                variable.reset(token)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+       Times every handler call into the handler histogram, labelled by the handler and the user's state.
+    """
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        labels = {"handler": handler_object.callback.__name__ if handler_object else "-",
+                  "state": data.get("raw_state") or "-"}
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - start, **labels)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+       Runs every handler call as a profiled invocation while the profiler is on.
+    """
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        if not profiler.enabled:
+            return await handler(event, data)
+
+        handler_object = data.get("handler")
+        return await profiler.run(handler_object.callback.__name__ if handler_object else "-", handler, event, data)
+
+
+class UserThrottle:
+    """
+       The throttling state of one user: the rate bucket and the last accepted update.
+    """
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate=rate, capacity=burst) if rate > 0 else None
+        self.last = None
+        self.waiting = 0
+        self.warned_at = None
+        self.used_at = time.monotonic()
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+       An outer update middleware that limits how much backend work a single user can cause.
+
+       The dispatcher already handles the updates of a user one at a time through its event isolation, so an
+       update reaches this middleware only after the user's previous update finished. An update identical to
+       the previous one is dropped for duplicate_window seconds after that one finished, so double taps and
+       resent photos run the handlers once. Beyond that every user gets a token bucket of rate updates per
+       second with bursts of up to burst updates, and updates over the limit are dropped. Dropped callback
+       queries are answered, so the button of the client stops loading. A user whose message is dropped by the
+       rate limit is asked to resend it and logged as a warning, at most once per notice_interval seconds.
+       Dropped updates are counted in bot_throttled_updates_total.
+    """
+    def __init__(self, rate: float = 3.0, burst: float = 20, duplicate_window: float = 0.3, idle_ttl: float = 600,
+                 notice_interval: float = 10):
+        """
+            Initialize the middleware.
+
+            Args:
+                rate (float): Sustained updates per second allowed per user. 0 disables the rate limit.
+                burst (float): Updates a user may send at once before the rate applies.
+                duplicate_window (float): Seconds after a handled update during which an identical one is dropped.
+                idle_ttl (float): Seconds after which the state of an idle user is forgotten.
+                notice_interval (float): Minimum seconds between two notices to a user whose messages are dropped.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.idle_ttl = idle_ttl
+        self.notice_interval = notice_interval
+        self._users = {}
+        self._pruned_at = time.monotonic()
+
+    @staticmethod
+    def get_fingerprint(event: TelegramObject):
+        """
+            Describes the content of an update, so identical repeats can be recognized.
+
+            Args:
+                event (TelegramObject): The update.
+
+            Returns:
+                tuple|None: The content of a message or callback query, or None for other updates.
+        """
+        if not isinstance(event, Update):
+            return None
+
+        if event.message:
+            message = event.message
+            photo = message.photo[-1].file_unique_id if message.photo else None
+            return "message", message.chat.id, message.text or message.caption, photo
+        if event.callback_query:
+            return "callback_query", event.callback_query.data
+
+        return None
+
+    @staticmethod
+    async def drop(event: TelegramObject, data: Dict[str, Any], reason: str):
+        """
+            Counts a dropped update and answers it if it is a callback query.
+
+            Args:
+                event (TelegramObject): The update.
+                data (Dict[str, Any]): The middleware data with the bot.
+                reason (str): The label of the drop in bot_throttled_updates_total.
+        """
+        THROTTLED_UPDATES.inc(reason=reason)
+        if isinstance(event, Update) and event.callback_query:
+            try:
+                await data["bot"].answer_callback_query(callback_query_id=event.callback_query.id)
+            except Exception as e:
+                logging.error(msg=f"Can't answer a dropped callback query: {e}")
+
+    async def warn(self, event: TelegramObject, data: Dict[str, Any], user: UserThrottle, telegram_id: int,
+                   now: float):
+        """
+            Logs a rate limited user and asks them to resend a dropped message, at most once per notice_interval.
+
+            Args:
+                event (TelegramObject): The dropped update.
+                data (Dict[str, Any]): The middleware data with the bot.
+                user (UserThrottle): The throttling state of the user.
+                telegram_id (int): The Telegram ID of the user.
+                now (float): The monotonic time of the update.
+        """
+        if user.warned_at is not None and now - user.warned_at < self.notice_interval:
+            return
+
+        user.warned_at = now
+        logging.warning(msg=f"Updates of user {telegram_id} are dropped by the rate limit")
+        if not isinstance(event, Update) or not event.message:
+            return
+
+        try:
+            user_language = await get_user_language(telegram_id)
+            if user_language in general_texts:
+                await data["bot"].send_message(chat_id=event.message.chat.id,
+                                               text=general_texts[user_language]["too_fast"])
+        except Exception as e:
+            logging.error(msg=f"Can't ask user {telegram_id} to resend a dropped message: {e}")
+
+    def _prune(self, now: float):
+        if now - self._pruned_at < 60:
+            return
+
+        self._pruned_at = now
+        for telegram_id in [telegram_id for telegram_id, user in self._users.items()
+                            if not user.waiting and now - user.used_at > self.idle_ttl]:
+            del self._users[telegram_id]
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        sender = data.get("event_from_user")
+        if sender is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._prune(now)
+        user = self._users.get(sender.id)
+        if user is None:
+            user = self._users[sender.id] = UserThrottle(rate=self.rate, burst=self.burst)
+        user.used_at = now
+
+        fingerprint = self.get_fingerprint(event)
+        if fingerprint is not None and user.last is not None and user.last[0] == fingerprint \
+                and (user.last[1] is None or now - user.last[1] < self.duplicate_window):
+            await self.drop(event, data, reason="duplicate")
+            return None
+
+        if user.bucket is not None and not user.bucket.try_acquire():
+            await self.drop(event, data, reason="rate_limited")
+            await self.warn(event, data, user, sender.id, now)
+            return None
+
+        # The finish time of this update, set once its handlers returned.
+        accepted = [fingerprint, None]
+        user.last = accepted
+        user.waiting += 1
+        try:
+            return await handler(event, data)
+        finally:
+            user.waiting -= 1
+            accepted[1] = user.used_at = time.monotonic()
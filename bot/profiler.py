@@ -0,0 +1,234 @@
+"""
+This module contains the on-demand sampling profiler of handler invocations and sync cycles.
+
+Profiling is switched on and off at runtime with the admin /profile command or SIGUSR2. While it is off, the
+profiled code only checks a flag. While it is on, a sampler thread records the stack of every running handler
+invocation and sync cycle every PROFILE_INTERVAL seconds. An invocation that is executing on the event loop
+is sampled from the interpreter stack; an invocation that is suspended is sampled from the chain of
+coroutines it awaits, so the time spent waiting for aiosqlite or a Google API call is attributed as well.
+For every invocation slower than PROFILE_THRESHOLD seconds, the PROFILE_TOP_STACKS most frequent stacks are
+written to a file in PROFILE_DIR, which keeps the newest PROFILE_MAX_FILES files.
+"""
+
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from collections import Counter
+
+from bot.settings import PROFILE_DIR, PROFILE_THRESHOLD, PROFILE_INTERVAL, PROFILE_TOP_STACKS, PROFILE_MAX_FILES
+
+
+def _describe(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Invocation:
+    """
+       A profiled call of a handler or job and the stacks sampled while it ran.
+    """
+    def __init__(self, name: str, coroutine, frame):
+        self.name = name
+        self.coroutine = coroutine
+        self.frame = frame
+        self.samples = []
+
+
+class SamplingProfiler:
+    """
+       A sampling profiler for coroutines running on the event loop, switched on and off at runtime.
+    """
+    def __init__(self, directory: str, threshold: float = 1.0, interval: float = 0.005, top_stacks: int = 20,
+                 max_files: int = 50):
+        """
+            Initialize the profiler, switched off.
+
+            Args:
+                directory (str): The directory the profiles of slow invocations are written to.
+                threshold (float): Seconds an invocation must take to have its profile written.
+                interval (float): Seconds between samples.
+                top_stacks (int): The number of most frequent stacks written per profile.
+                max_files (int): The number of newest profiles kept in the directory.
+        """
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.top_stacks = top_stacks
+        self.max_files = max_files
+        self.enabled = False
+        self._active = {}
+        self._thread = None
+        self._loop_thread_id = None
+        self._sequence = itertools.count(1)
+
+    def enable(self):
+        """
+            Starts sampling the invocations. Must be called from the event loop thread.
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample_periodically, name="profiler", daemon=True)
+        self._thread.start()
+        logging.info(msg=f"Profiling enabled, invocations slower than {self.threshold} seconds are written to "
+                         f"{self.directory}")
+
+    def disable(self):
+        """
+            Stops sampling. Invocations still running are not written.
+        """
+        if not self.enabled:
+            return
+
+        self.enabled = False
+        self._thread = None
+        logging.info(msg="Profiling disabled")
+
+    def toggle(self) -> bool:
+        """
+            Switches profiling on or off.
+
+            Returns:
+                bool: True if profiling is on now.
+        """
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+        return self.enabled
+
+    def install_signal_handler(self):
+        """
+            Makes SIGUSR2 toggle profiling, on platforms that have it.
+        """
+        if hasattr(signal, "SIGUSR2"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, self.toggle)
+
+    async def run(self, name: str, func, *args, **kwargs):
+        """
+            Runs a coroutine function as a profiled invocation.
+
+            Args:
+                name (str): The name of the invocation used in the profile file name.
+                func: The coroutine function.
+                *args: Positional arguments of the function.
+                **kwargs: Keyword arguments of the function.
+
+            Returns:
+                The result of the function.
+        """
+        coroutine = func(*args, **kwargs)
+        # The frame of this call stays on the stack while the invocation executes, which identifies its samples.
+        invocation = Invocation(name, coroutine, sys._getframe())
+        self._active[id(invocation.frame)] = invocation
+
+        start = time.perf_counter()
+        try:
+            return await coroutine
+        finally:
+            duration = time.perf_counter() - start
+            del self._active[id(invocation.frame)]
+            if duration >= self.threshold and invocation.samples:
+                asyncio.get_running_loop().run_in_executor(None, self._write_profile, invocation, duration)
+
+    def _sample_running(self, frame):
+        stack = []
+        while frame is not None:
+            invocation = self._active.get(id(frame))
+            if invocation is not None and invocation.frame is frame:
+                invocation.samples.append(tuple(reversed(stack)))
+                return invocation
+            stack.append(_describe(frame))
+            frame = frame.f_back
+
+        return None
+
+    @staticmethod
+    def _sample_waiting(invocation: Invocation):
+        stack = []
+        awaitable = invocation.coroutine
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                stack.append(f"[waiting for {type(awaitable).__name__}]")
+                break
+            stack.append(_describe(frame))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+
+        invocation.samples.append(tuple(stack))
+
+    def _sample_periodically(self):
+        # A sampler thread stops when profiling is disabled, even if it is enabled again with a new thread.
+        while self._thread is threading.current_thread():
+            time.sleep(self.interval)
+            invocations = list(self._active.values())
+            if not invocations:
+                continue
+
+            running = self._sample_running(sys._current_frames().get(self._loop_thread_id))
+            for invocation in invocations:
+                if invocation is not running:
+                    self._sample_waiting(invocation)
+
+    def _write_profile(self, invocation: Invocation, duration: float):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stacks = Counter(invocation.samples)
+            total = len(invocation.samples)
+
+            lines = [f"{invocation.name}: {duration:.3f} seconds, {total} samples every {self.interval} seconds", ""]
+            for stack, count in stacks.most_common(self.top_stacks):
+                lines.append(f"{count} samples ({count / total:.0%}):")
+                lines.extend(f"    {entry}" for entry in stack)
+                lines.append("")
+
+            file_name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._sequence):06d}-{invocation.name}-"
+                         f"{int(duration * 1000)}ms.txt")
+            with open(os.path.join(self.directory, file_name), "w", encoding="utf-8") as file:
+                file.write("\n".join(lines))
+
+            profiles = sorted((os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                               if name.endswith(".txt")), key=os.path.getmtime)
+            for path in profiles[:-self.max_files]:
+                os.remove(path)
+        except Exception as e:
+            logging.error(msg=f"Can't write profile of {invocation.name}: {e}")
+
+
+profiler = SamplingProfiler(directory=PROFILE_DIR, threshold=PROFILE_THRESHOLD, interval=PROFILE_INTERVAL,
+                            top_stacks=PROFILE_TOP_STACKS, max_files=PROFILE_MAX_FILES)
+
+
+def profiled(name: str = None):
+    """
+        Decorates a coroutine function to run it as a profiled invocation while profiling is on.
+
+        Args:
+            name (str, optional): The name of the invocation. Defaults to the function name.
+
+        Returns:
+            The decorator.
+    """
+    def decorator(func):
+        invocation_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return await func(*args, **kwargs)
+
+            return await profiler.run(invocation_name, func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
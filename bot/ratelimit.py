@@ -0,0 +1,58 @@
+"""
+This module contains the token bucket rate limiter shared by the parts of the bot that talk to Telegram.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+       A token bucket that allows short bursts up to its capacity and a sustained rate of tokens per second.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        """
+            Initialize the bucket full.
+
+            Args:
+                rate (float): Tokens added per second.
+                capacity (float, optional): The maximum number of tokens. Defaults to the rate.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+            Takes tokens from the bucket without waiting.
+
+            Args:
+                tokens (float): The number of tokens to take.
+
+            Returns:
+                bool: True if the tokens were taken, False if the bucket does not hold enough of them.
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        """
+            Takes tokens from the bucket, waiting until enough of them are available.
+
+            Args:
+                tokens (float): The number of tokens to take.
+        """
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
@@ -0,0 +1,260 @@
+"""
+This module contains a small cron-like scheduler for the periodic jobs of the bot.
+
+Jobs are defined with five-field cron expressions (minute, hour, day of month, month, day of week). The
+scheduler computes the next fire time of every job directly and sleeps until then instead of polling. Every
+fire time is a window that is claimed in the scheduler_runs table before the job runs, so a window fires
+once even if several processes share the database. A window whose run was interrupted, or that was missed
+while the bot was down, is fired at startup if it is still within the job's misfire grace period. An
+interrupted run is taken over by claiming it as resumed, so it is resumed once. Database errors of the
+scheduler itself are logged per job and do not stop the other jobs.
+
+Supported field syntax: "*", "*/n", "a", "a-b", "a-b/n" and comma-separated lists of these. The day of month
+field also accepts "L" for the last day of the month and "L-n" for n days before it. Days of week are
+numbered 0-6 starting from Sunday. When both the day of month and the day of week are restricted, a day must
+match both of them.
+"""
+
+import asyncio
+import calendar
+import logging
+import time
+
+from datetime import datetime, timedelta
+
+from bot.metrics import JOB_DURATION
+from bot.settings import DB_NAME
+from database.main import DatabaseManager
+
+
+def _parse_field(field: str, minimum: int, maximum: int):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-"))
+        else:
+            start = end = int(part)
+
+        if start < minimum or end > maximum or start > end or step < 1:
+            raise ValueError(f"Invalid cron field: {field}")
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronSchedule:
+    """
+       A parsed cron expression that can compute its previous and next fire times.
+    """
+    def __init__(self, expression: str):
+        """
+            Parse the expression.
+
+            Args:
+                expression (str): A five-field cron expression, e.g. "0 19 L-2 * *".
+        """
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression}")
+
+        minute, hour, day, month, weekday = fields
+        self.expression = expression
+        self.minutes = sorted(_parse_field(minute, 0, 59))
+        self.hours = sorted(_parse_field(hour, 0, 23))
+        self.months = _parse_field(month, 1, 12)
+        self.weekdays = _parse_field(weekday, 0, 6)
+
+        self.days = set()
+        self.days_before_end = set()
+        for part in day.split(","):
+            if part == "L":
+                self.days_before_end.add(0)
+            elif part.startswith("L-"):
+                self.days_before_end.add(int(part[2:]))
+            else:
+                self.days.update(_parse_field(part, 1, 31))
+
+    def matches_date(self, date) -> bool:
+        """
+            Checks whether the schedule fires on the given date.
+
+            Args:
+                date (date): The date to check.
+
+            Returns:
+                bool: True if the month, day of month and day of week match.
+        """
+        if date.month not in self.months or (date.weekday() + 1) % 7 not in self.weekdays:
+            return False
+
+        days_in_month = calendar.monthrange(date.year, date.month)[1]
+        return date.day in self.days or days_in_month - date.day in self.days_before_end
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+            Computes the first fire time strictly after the given moment.
+
+            Args:
+                moment (datetime): The moment to start from.
+
+            Returns:
+                datetime: The next fire time.
+        """
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for offset in range(366 * 5):
+            date = start.date() + timedelta(days=offset)
+            if not self.matches_date(date):
+                continue
+
+            for hour in self.hours:
+                for minute in self.minutes:
+                    candidate = datetime(date.year, date.month, date.day, hour, minute)
+                    if candidate >= start:
+                        return candidate
+
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+    def previous_before(self, moment: datetime):
+        """
+            Computes the last fire time at or before the given moment.
+
+            Args:
+                moment (datetime): The moment to start from.
+
+            Returns:
+                datetime|None: The previous fire time, or None if there was none in the last five years.
+        """
+        end = moment.replace(second=0, microsecond=0)
+        for offset in range(366 * 5):
+            date = end.date() - timedelta(days=offset)
+            if not self.matches_date(date):
+                continue
+
+            for hour in reversed(self.hours):
+                for minute in reversed(self.minutes):
+                    candidate = datetime(date.year, date.month, date.day, hour, minute)
+                    if candidate <= end:
+                        return candidate
+
+        return None
+
+
+class Job:
+    """
+       A coroutine function fired on a cron schedule.
+    """
+    def __init__(self, name: str, expression: str, func, misfire_grace: float = 0):
+        """
+            Initialize the job.
+
+            Args:
+                name (str): A unique name under which the run state is stored.
+                expression (str): The cron expression of the job.
+                func: A coroutine function without arguments.
+                misfire_grace (float): Seconds after a missed fire time during which it is still fired at startup.
+        """
+        self.name = name
+        self.schedule = CronSchedule(expression)
+        self.func = func
+        self.misfire_grace = misfire_grace
+
+
+class Scheduler:
+    """
+       Runs every added job at its fire times, at most once per fire time.
+    """
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, name: str, expression: str, func, misfire_grace: float = 0):
+        """
+            Adds a job to the scheduler.
+
+            Args:
+                name (str): A unique name under which the run state is stored.
+                expression (str): The cron expression of the job.
+                func: A coroutine function without arguments.
+                misfire_grace (float): Seconds after a missed fire time during which it is still fired at startup.
+        """
+        self.jobs.append(Job(name=name, expression=expression, func=func, misfire_grace=misfire_grace))
+
+    async def run(self):
+        """
+            Runs all jobs until cancelled.
+        """
+        await asyncio.gather(*(self._run_job(job) for job in self.jobs))
+
+    async def _run_job(self, job: Job):
+        try:
+            await self._recover(job)
+        except Exception as e:
+            logging.error(msg=f"Job {job.name}: can't recover missed or interrupted runs: {e}")
+
+        while True:
+            window = job.schedule.next_after(datetime.now())
+            # Sleeping in bounded steps keeps the fire time right if the wall clock is adjusted meanwhile.
+            while (remaining := (window - datetime.now()).total_seconds()) > 0:
+                await asyncio.sleep(min(remaining, 300))
+
+            await self._fire(job, window)
+
+    async def _recover(self, job: Job):
+        now = datetime.now()
+        window = job.schedule.previous_before(now)
+        if window is None or (now - window).total_seconds() > job.misfire_grace:
+            return
+
+        async with DatabaseManager(DB_NAME) as db:
+            parameters = {"column": "job_name",
+                          "value": job.name}
+            job_state = await db.check_data(table_name="scheduler_runs", parameters=parameters)
+
+        if job_state and job_state[0]["last_window"] == window.isoformat() and job_state[0]["status"] == "running":
+            logging.info(msg=f"Job {job.name}: resuming interrupted run of {window}")
+            await self._fire(job, window, resume=True)
+
+        elif not job_state or job_state[0]["last_window"] < window.isoformat():
+            logging.info(msg=f"Job {job.name}: firing missed run of {window}")
+            await self._fire(job, window)
+
+    async def _fire(self, job: Job, window: datetime, resume: bool = False):
+        try:
+            async with DatabaseManager(DB_NAME) as db:
+                if resume:
+                    claimed = await db.claim_job_resume(job_name=job.name, window=window.isoformat())
+                else:
+                    claimed = await db.claim_job_window(job_name=job.name, window=window.isoformat())
+        except Exception as e:
+            logging.error(msg=f"Job {job.name}: can't claim the run of {window}: {e}")
+            return
+
+        if not claimed:
+            logging.info(msg=f"Job {job.name}: run of {window} was already claimed")
+            return
+
+        start = time.time()
+        status = "done"
+        try:
+            await job.func()
+        except Exception as e:
+            status = "failed"
+            logging.error(msg=f"Job {job.name} failed: {e}")
+
+        try:
+            async with DatabaseManager(DB_NAME) as db:
+                data = {"status": status}
+                identifier = {"job_name": job.name}
+                await db.update_data(table_name="scheduler_runs", data=data, identifier=identifier)
+        except Exception as e:
+            logging.error(msg=f"Job {job.name}: can't store the status of the run of {window}: {e}")
+
+        JOB_DURATION.observe(time.time() - start, job=job.name)
+        logging.info(msg=f"Job {job.name}: run of {window} {status} in {round(time.time() - start, 2)} seconds")
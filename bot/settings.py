@@ -3,10 +3,10 @@ This module sets up the logging configuration for the application and loads envi
 It is primarily responsible for initializing the logger and retrieving the Telegram bot token from environment
 variables.
 
-The module configures the logger to record messages in a specified format with timestamps, logging levels,
-and message details.
-It writes these logs to a file named 'logs.log'. The logging level is set to INFO, meaning it captures all messages
-of level INFO and above.
+The module configures the logger through bot.logger to record messages in a specified format with timestamps,
+logging levels, message details and the structured fields of the handled update.
+It writes these logs from a background thread to a size-rotated file named 'logs.log' by default. The logging level
+is set to INFO, meaning it captures all messages of level INFO and above.
 
 Additionally, the module uses the dotenv library to load environment variables from a '.env' file. This approach is
 used to securely manage sensitive data, such as the Telegram bot token, which is retrieved from these environment
@@ -20,9 +20,67 @@ Imports:
     - logging: Standard Python library for logging events.
     - os: Standard Python library to interact with the operating system.
     - load_dotenv: Function from the dotenv library to load environment variables from a .env file.
+    - setup_logging: Function from bot.logger that configures non-blocking, rotating logging.
 
 Variables:
+    - LOG_FILE: The path of the log file.
+    - LOG_MAX_BYTES: The size in bytes at which the log file is rotated.
+    - LOG_BACKUP_COUNT: The number of rotated log files kept.
     - TOKEN: The Telegram bot token retrieved from the environment variables.
+    - DB_NAME: The SQLite database file used by the bot.
+    - DB_POOL_SIZE: The number of long-lived connections kept in the database connection pool.
+    - DB_POOL_HEALTH_CHECK_INTERVAL: Seconds a pooled connection may stay idle before it is checked on lease.
+    - DB_WRITER_COMMIT_WINDOW: Seconds the database writer waits for more write requests before committing a batch.
+    - DB_WRITER_MAX_BATCH: The maximum number of write requests committed in one transaction.
+    - SYNC_MODE: "incremental" to sync only changed spreadsheet rows, "staging" to reconcile the accounts with
+      set-based statements over staging tables, or "full" to rewrite every account.
+    - LANGUAGE_CACHE_SIZE: The maximum number of users whose language is kept in memory.
+    - LANGUAGE_CACHE_TTL: Seconds a cached user language stays valid.
+    - SYNC_SCHEDULE: The cron expression of the spreadsheet synchronization job.
+    - SYNC_MISFIRE_GRACE: Seconds after a missed synchronization during which it still runs at startup.
+    - NOTIFICATION_SCHEDULE: The cron expression of the month-end notification job.
+    - NOTIFICATION_MISFIRE_GRACE: Seconds after a missed notification time during which it is still sent at startup.
+    - USER_INPUT_RECONCILE_SCHEDULE: The cron expression of the reconciliation of the user input mirror with the
+      user input spreadsheet.
+    - USER_INPUT_RECONCILE_MISFIRE_GRACE: Seconds after a missed reconciliation during which it still runs at startup.
+    - SHEET_OUTBOX_FLUSH_INTERVAL: Seconds between appends of the queued readings to the user input spreadsheet.
+    - SHEET_OUTBOX_BATCH_SIZE: The number of queued readings that triggers an early append, and the append size limit.
+    - SHEET_OUTBOX_MAX_BACKOFF: The maximum delay in seconds between retries of a failed append.
+    - PHOTO_SPOOL_THRESHOLD: The size in bytes above which a photo is buffered in a temporary file instead of memory.
+    - PHOTO_TARGET_SIZE: The length in pixels of the longer side of uploaded photos, 0 uploads the largest size.
+    - PHOTO_JPEG_QUALITY: The JPEG quality of downscaled photos.
+    - PHOTO_PROCESS_WORKERS: The number of worker processes downscaling photos.
+    - GOOGLE_INTERACTIVE_WORKERS: The number of threads for Google API calls made on behalf of users.
+    - GOOGLE_BACKGROUND_WORKERS: The number of threads for Google API calls of the spreadsheet synchronization.
+    - KEYBOARD_CACHE_SIZE: The maximum number of account keyboards kept in memory.
+    - ACCOUNT_FILTER_ENABLED: Keep the known account numbers in memory to reject unknown ones without a query.
+    - ACCOUNT_FILTER_TTL: Seconds after which the in-memory account numbers are reloaded from the database.
+    - FSM_CACHE_SIZE: The maximum number of conversations kept in memory in front of the FSM storage table.
+    - FSM_TTL: Seconds after the last change when an abandoned conversation expires.
+    - FSM_FLUSH_INTERVAL: Seconds between batched writes of conversation changes to the database.
+    - BROADCAST_CONCURRENCY: The number of notification messages sent at the same time.
+    - BROADCAST_GLOBAL_RATE: The maximum number of notification messages per second across all chats.
+    - BROADCAST_PER_CHAT_RATE: The maximum number of messages per second sent to a single chat.
+    - BROADCAST_MAX_RETRIES: How many times a notification is retried after a transient error.
+    - THROTTLE_RATE: The sustained number of updates per second handled for a single user, 0 disables the limit.
+    - THROTTLE_BURST: The number of updates a single user may send at once before THROTTLE_RATE applies.
+    - THROTTLE_DUPLICATE_WINDOW: Seconds after a handled update during which an identical update is dropped.
+    - METRICS_HOST: The address of the Prometheus metrics endpoint.
+    - METRICS_PORT: The port of the Prometheus metrics endpoint, 0 to disable it.
+    - ADMIN_IDS: The Telegram IDs allowed to use the admin commands, from a comma-separated list.
+    - BOT_MODE: "polling" to fetch updates with long polling, or "webhook" to receive them on a web server.
+    - WEBHOOK_URL: The public base URL registered at Telegram in webhook mode, empty to keep the registration.
+    - WEBHOOK_PATH: The URL path of the webhook.
+    - WEBHOOK_SECRET: The secret token Telegram must send with every update, required in webhook mode.
+    - WEBHOOK_HOST: The address the webhook server listens on.
+    - WEBHOOK_PORT: The port the webhook server listens on.
+    - WEBHOOK_CONCURRENCY: The maximum number of updates processed at the same time in webhook mode.
+    - WEBHOOK_SHUTDOWN_TIMEOUT: Seconds to wait for the updates in progress when the webhook server stops.
+    - PROFILE_DIR: The directory the profiles of slow handlers and sync cycles are written to.
+    - PROFILE_THRESHOLD: Seconds a handler or sync cycle must take to have its profile written while profiling is on.
+    - PROFILE_INTERVAL: Seconds between the stack samples of the profiler.
+    - PROFILE_TOP_STACKS: The number of most frequent stacks written per profile.
+    - PROFILE_MAX_FILES: The number of newest profiles kept in PROFILE_DIR.
 
 Exceptions:
     - KeyError: Raised if the 'BOT_TOKEN' environment variable is not found.
@@ -33,13 +91,70 @@ import logging
 import os
 
 from dotenv import load_dotenv
+from bot.logger import setup_logging
 
-logging.basicConfig(filename='logs.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
 load_dotenv()
 
+LOG_FILE = os.getenv("LOG_FILE", "logs.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+setup_logging(filename=LOG_FILE, level=logging.INFO, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT)
+
 try:
     TOKEN = os.environ['BOT_TOKEN']
 except KeyError as err:
     logging.critical(f"Can't read token from environment variable. Message: {err}")
     raise KeyError(err)
+
+DB_NAME = os.getenv("DB_NAME", "test.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+DB_WRITER_COMMIT_WINDOW = float(os.getenv("DB_WRITER_COMMIT_WINDOW", 0.005))
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", 100))
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")
+LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", 10000))
+LANGUAGE_CACHE_TTL = float(os.getenv("LANGUAGE_CACHE_TTL", 3600))
+SYNC_SCHEDULE = os.getenv("SYNC_SCHEDULE", "*/10 * * * *")
+SYNC_MISFIRE_GRACE = float(os.getenv("SYNC_MISFIRE_GRACE", 600))
+NOTIFICATION_SCHEDULE = os.getenv("NOTIFICATION_SCHEDULE", "0 19 L-2 * *")
+NOTIFICATION_MISFIRE_GRACE = float(os.getenv("NOTIFICATION_MISFIRE_GRACE", 3600))
+USER_INPUT_RECONCILE_SCHEDULE = os.getenv("USER_INPUT_RECONCILE_SCHEDULE", "5 * * * *")
+USER_INPUT_RECONCILE_MISFIRE_GRACE = float(os.getenv("USER_INPUT_RECONCILE_MISFIRE_GRACE", 3600))
+SHEET_OUTBOX_FLUSH_INTERVAL = float(os.getenv("SHEET_OUTBOX_FLUSH_INTERVAL", 5))
+SHEET_OUTBOX_BATCH_SIZE = int(os.getenv("SHEET_OUTBOX_BATCH_SIZE", 50))
+SHEET_OUTBOX_MAX_BACKOFF = float(os.getenv("SHEET_OUTBOX_MAX_BACKOFF", 300))
+PHOTO_SPOOL_THRESHOLD = int(os.getenv("PHOTO_SPOOL_THRESHOLD", 2 * 1024 * 1024))
+PHOTO_TARGET_SIZE = int(os.getenv("PHOTO_TARGET_SIZE", 1280))
+PHOTO_JPEG_QUALITY = int(os.getenv("PHOTO_JPEG_QUALITY", 85))
+PHOTO_PROCESS_WORKERS = int(os.getenv("PHOTO_PROCESS_WORKERS", 2))
+GOOGLE_INTERACTIVE_WORKERS = int(os.getenv("GOOGLE_INTERACTIVE_WORKERS", 4))
+GOOGLE_BACKGROUND_WORKERS = int(os.getenv("GOOGLE_BACKGROUND_WORKERS", 2))
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", 10000))
+ACCOUNT_FILTER_ENABLED = os.getenv("ACCOUNT_FILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+ACCOUNT_FILTER_TTL = float(os.getenv("ACCOUNT_FILTER_TTL", 600))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 1000))
+FSM_TTL = float(os.getenv("FSM_TTL", 86400))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 1))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 10))
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", 25))
+BROADCAST_PER_CHAT_RATE = float(os.getenv("BROADCAST_PER_CHAT_RATE", 1))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", 5))
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", 3))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", 20))
+THROTTLE_DUPLICATE_WINDOW = float(os.getenv("THROTTLE_DUPLICATE_WINDOW", 0.3))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9101))
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()}
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 20))
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", 30))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_THRESHOLD = float(os.getenv("PROFILE_THRESHOLD", 1))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_TOP_STACKS = int(os.getenv("PROFILE_TOP_STACKS", 20))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
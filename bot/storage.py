@@ -0,0 +1,193 @@
+"""
+This module contains the SQLite-backed FSM storage used by the dispatcher instead of aiogram's MemoryStorage.
+
+Conversation states and data are stored in the fsm_storage table as compact JSON, so they survive restarts.
+Recently used records are kept in a small LRU front cache. Changes are collected in memory and written in
+batches every FSM_FLUSH_INTERVAL seconds and when the dispatcher shuts down, so a crash loses at most the
+changes of that interval. Because of this write-back buffer, only one bot process may use the storage of a
+database at a time: another process would read conversations as they were at the last flush. Conversations that
+were not touched for FSM_TTL seconds are treated as finished and removed from the database.
+
+UserEventIsolation makes the dispatcher handle the updates of a conversation one at a time, so every update
+is routed with the state left by the previous one.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StorageKey, StateType
+
+from database.main import DatabaseManager
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """
+       Serializes the updates of every conversation with a lock that is removed once no update holds or awaits it.
+    """
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+       An FSM storage that keeps conversations in SQLite behind an in-memory front cache and a write buffer.
+    """
+    def __init__(self, db_name: str, cache_size: int = 1000, ttl: float = 86400, flush_interval: float = 1.0):
+        """
+            Initialize the storage.
+
+            Args:
+                db_name (str): The name of the SQLite database file.
+                cache_size (int): The maximum number of conversations kept in the front cache.
+                ttl (float): Seconds after the last change when a conversation expires.
+                flush_interval (float): Seconds between writes of the buffered changes.
+        """
+        self.db_name = db_name
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._cache = OrderedDict()
+        self._dirty = {}
+        # The batch being written by flush, readable until its transaction is committed.
+        self._flushing = {}
+        self._flush_task = None
+        self._last_expiry = 0.0
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _remember(self, storage_key: str, record: list):
+        self._cache[storage_key] = record
+        self._cache.move_to_end(storage_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, storage_key: str) -> list:
+        record = self._cache.get(storage_key) or self._dirty.get(storage_key) or self._flushing.get(storage_key)
+        if record is None:
+            async with DatabaseManager(self.db_name) as db:
+                parameters = {"column": "storage_key",
+                              "value": storage_key}
+                rows = await db.check_data(table_name="fsm_storage", parameters=parameters)
+
+            if rows:
+                record = [rows[0]["state"], json.loads(rows[0]["data"]), rows[0]["updated_at"]]
+            else:
+                record = [None, {}, time.time()]
+
+        if time.time() - record[2] > self.ttl:
+            record = [None, {}, time.time()]
+
+        self._remember(storage_key, record)
+        return record
+
+    def _mark_dirty(self, storage_key: str, record: list):
+        record[2] = time.time()
+        self._dirty[storage_key] = record
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._make_key(key)
+        record = await self._load(storage_key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._load(self._make_key(key))
+        return record[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._make_key(key)
+        record = await self._load(storage_key)
+        record[1] = data.copy()
+        self._mark_dirty(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._load(self._make_key(key))
+        return record[1].copy()
+
+    async def flush(self):
+        """
+            Writes the buffered changes to the database. Finished conversations are deleted instead of stored.
+        """
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        self._flushing = dirty
+        rows = [{"storage_key": storage_key,
+                 "state": record[0],
+                 "data": json.dumps(record[1], separators=(",", ":")),
+                 "updated_at": record[2]} for storage_key, record in dirty.items() if record[0] or record[1]]
+        finished = [storage_key for storage_key, record in dirty.items() if not record[0] and not record[1]]
+
+        try:
+            async def write_changes(writer_db: DatabaseManager):
+                await writer_db.upsert_many(table_name="fsm_storage", rows=rows, key="storage_key")
+                await writer_db.delete_many(table_name="fsm_storage", column="storage_key", values=finished)
+
+            async with DatabaseManager(self.db_name) as db:
+                await db.run_in_transaction(write_changes)
+        except BaseException:
+            for storage_key, record in dirty.items():
+                self._dirty.setdefault(storage_key, record)
+            raise
+        finally:
+            self._flushing = {}
+
+    async def expire(self):
+        """
+            Removes the conversations that were not changed for longer than the TTL.
+        """
+        threshold = time.time() - self.ttl
+        async with DatabaseManager(self.db_name) as db:
+            await db.delete_older_than(table_name="fsm_storage", column="updated_at", threshold=threshold)
+
+        for storage_key in [storage_key for storage_key, record in self._cache.items() if record[2] < threshold]:
+            del self._cache[storage_key]
+
+        self._last_expiry = time.time()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - self._last_expiry > min(self.ttl, 3600):
+                    await self.expire()
+            except Exception as e:
+                logging.error(msg=f"Can't write FSM storage: {e}")
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        await self.flush()
@@ -27,11 +27,13 @@ general_texts = {
                     "incorrect_format_of_account": "",
                     "incorrect_account_data": "",
                     "choose_action_with_account": "",
+                    "monthly_consumption": "",
                     "choose_action_from_menu": "",
                     "confirmation_indicator": "",
                     "indicator_less": "",
                     "upload_photo": "",
-                    "confirm_deleting": ""
+                    "confirm_deleting": "",
+                    "too_fast": ""
                 },
                 "en": {
                     "input_personal_account": "",
@@ -50,11 +52,13 @@ general_texts = {
                     "incorrect_format_of_account": "",
                     "incorrect_account_data": "",
                     "choose_action_with_account": "",
+                    "monthly_consumption": "",
                     "choose_action_from_menu": "",
                     "confirmation_indicator": "",
                     "indicator_less": "",
                     "upload_photo": "",
-                    "confirm_deleting": ""
+                    "confirm_deleting": "",
+                    "too_fast": ""
                 }
             }
 
@@ -0,0 +1,127 @@
+"""
+This module contains the webhook mode of the bot, an alternative to long polling selected with BOT_MODE=webhook.
+
+Telegram POSTs every update to an aiohttp server running on the bot's event loop. Requests without the
+configured secret token are rejected. Each update is acknowledged as soon as a processing slot is free and
+then handled in the background, with at most WEBHOOK_CONCURRENCY updates in progress; while all slots are
+busy, new requests wait, so Telegram slows down instead of the bot queueing work without limit. On SIGINT or
+SIGTERM the server stops accepting updates, waits up to WEBHOOK_SHUTDOWN_TIMEOUT seconds for the updates in
+progress and then shuts the dispatcher down, which writes out the FSM storage.
+"""
+
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """
+       A webhook request handler with a limit on concurrently processed updates and a draining shutdown.
+    """
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, concurrency: int = 20,
+                 shutdown_timeout: float = 30.0, **data):
+        """
+            Initialize the handler.
+
+            Args:
+                dispatcher (Dispatcher): The dispatcher that handles the updates.
+                bot (Bot): The bot the updates are addressed to.
+                secret_token (str): The secret Telegram sends in the X-Telegram-Bot-Api-Secret-Token header.
+                concurrency (int): The maximum number of updates processed at the same time.
+                shutdown_timeout (float): Seconds to wait for the updates in progress on shutdown.
+        """
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, secret_token=secret_token,
+                         **data)
+        self.concurrency = concurrency
+        self.shutdown_timeout = shutdown_timeout
+        self._slots = asyncio.Semaphore(concurrency)
+        self._closing = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._closing:
+            # Telegram redelivers updates that were not acknowledged with a 2xx response.
+            return web.Response(text="Shutting down", status=503)
+
+        return await super().handle(request)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+
+        task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        task.add_done_callback(lambda _: self._slots.release())
+
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        """
+            Stops accepting updates, waits for the ones in progress and closes the bot session.
+        """
+        self._closing = True
+        if self._background_feed_update_tasks:
+            logging.info(msg=f"Waiting for {len(self._background_feed_update_tasks)} updates before shutdown")
+            _, pending = await asyncio.wait(self._background_feed_update_tasks, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logging.error(msg=f"Cancelled {len(pending)} updates still running after "
+                                  f"{self.shutdown_timeout} seconds")
+
+        await super().close()
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, host: str, port: int, path: str, secret_token: str,
+                      url: str = "", concurrency: int = 20, shutdown_timeout: float = 30.0):
+    """
+        Serves the webhook until SIGINT or SIGTERM is received or the task is cancelled.
+
+        Args:
+            dispatcher (Dispatcher): The dispatcher that handles the updates.
+            bot (Bot): The bot the updates are addressed to.
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            path (str): The URL path of the webhook.
+            secret_token (str): The secret Telegram must send with every update.
+            url (str): The public base URL registered at Telegram. Empty to leave the registration unchanged.
+            concurrency (int): The maximum number of updates processed at the same time.
+            shutdown_timeout (float): Seconds to wait for the updates in progress on shutdown.
+
+        Raises:
+            ValueError: If no secret token is configured.
+    """
+    if not secret_token:
+        raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+
+    app = web.Application()
+    handler = WebhookRequestHandler(dispatcher=dispatcher, bot=bot, secret_token=secret_token,
+                                    concurrency=concurrency, shutdown_timeout=shutdown_timeout)
+    handler.register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    try:
+        await web.TCPSite(runner, host, port).start()
+        if url:
+            await bot.set_webhook(url=f"{url.rstrip('/')}{path}", secret_token=secret_token,
+                                  max_connections=min(concurrency, 100),
+                                  allowed_updates=dispatcher.resolve_used_update_types())
+        logging.info(msg=f"Webhook served at {host}:{port}{path} with concurrency {concurrency}")
+        await stop.wait()
+        logging.info(msg="Webhook stopping")
+    finally:
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signal_number)
+        await runner.cleanup()
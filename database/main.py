@@ -2,8 +2,52 @@
 This module contains the DatabaseManager class for managing SQLite database operations asynchronously.
 """
 
+import functools
+import logging
+
 import aiosqlite
 
+from bot.metrics import DB_DURATION, DB_ERRORS, timed
+from database.migrations import MIGRATIONS
+from database.pool import get_pool
+from database.writer import get_writer
+
+
+def writes(exclusive: bool = False):
+    """
+        Decorates a DatabaseManager method that modifies the database to run it on the registered writer.
+
+        Without a registered writer, or when the manager already runs on the write connection, the method runs
+        on the manager's own connection.
+
+        Args:
+            exclusive (bool): The method manages its own transaction and must not be batched with other writes.
+
+        Returns:
+            The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            writer = get_writer(self.db_name)
+            if writer is None or self.conn is writer.connection:
+                return await func(self, *args, **kwargs)
+
+            async def operation(conn):
+                manager = DatabaseManager(self.db_name)
+                manager.conn = conn
+                manager.cursor = await conn.cursor()
+                try:
+                    return await func(manager, *args, **kwargs)
+                finally:
+                    await manager.cursor.close()
+
+            return await writer.submit(operation, exclusive=exclusive)
+
+        return wrapper
+
+    return decorator
+
 
 class DatabaseManager:
     """
@@ -21,28 +65,44 @@ class DatabaseManager:
     async def __aenter__(self):
         """
             Async enter method for using the database as a context manager.
-            Opens a connection to the database and returns self.
+            Leases a connection from the registered pool, or opens a new one if there is no pool, and returns self.
 
             Returns:
                 DatabaseManager: The DatabaseManager instance.
         """
-        self.conn = await aiosqlite.connect(self.db_name)
+        self.pool = get_pool(self.db_name)
+        if self.pool:
+            self.conn = await self.pool.acquire()
+        else:
+            self.conn = await aiosqlite.connect(self.db_name)
         self.cursor = await self.conn.cursor()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """
             Async exit method for using the database as a context manager.
-            Commits changes and closes the connection.
+            Commits changes and returns the connection to the pool, or closes it if there is no pool.
 
             Args:
                 exc_type: Exception type.
                 exc_val: Exception value.
                 exc_tb: Exception traceback.
         """
-        await self.conn.commit()
-        await self.conn.close()
-
+        discard = False
+        try:
+            await self.conn.commit()
+        except Exception:
+            discard = True
+            raise
+        finally:
+            await self.cursor.close()
+            if self.pool:
+                await self.pool.release(self.conn, discard=discard)
+            else:
+                await self.conn.close()
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
     async def create_tables(self):
         """
             Creates all necessary tables in the database if they don't already exist.
@@ -75,6 +135,88 @@ class DatabaseManager:
                                                         )
                                         ''')
 
+        await self.cursor.execute('''
+                                     CREATE TABLE IF NOT EXISTS sync_state (
+                                           key TEXT PRIMARY KEY,
+                                           value TEXT
+                                                        )
+                                        ''')
+
+        await self.cursor.execute('''
+                                     CREATE TABLE IF NOT EXISTS sync_row_hashes (
+                                           personal_account TEXT PRIMARY KEY,
+                                           row_hash TEXT NOT NULL
+                                                        )
+                                        ''')
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes(exclusive=True)
+    async def apply_migrations(self, migrations: list = None):
+        """
+            Applies the schema migrations that have not been applied to the database yet.
+
+            The applied versions are recorded in the schema_version table. Every migration runs in its own
+            transaction, so a failing migration leaves the database at the previous version.
+
+            Args:
+                migrations (list, optional): Migrations as (version, description, statements) tuples.
+                    Defaults to MIGRATIONS.
+
+            Returns:
+                int: The schema version after applying the migrations.
+        """
+        if migrations is None:
+            migrations = MIGRATIONS
+
+        await self.cursor.execute('''
+                                     CREATE TABLE IF NOT EXISTS schema_version (
+                                           version INTEGER PRIMARY KEY,
+                                           description TEXT,
+                                           applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+                                                        )
+                                        ''')
+        await self.conn.commit()
+
+        await self.cursor.execute("SELECT MAX(version) FROM schema_version")
+        current_version = (await self.cursor.fetchone())[0] or 0
+
+        for version, description, statements in sorted(migrations, key=lambda migration: migration[0]):
+            if version <= current_version:
+                continue
+
+            try:
+                await self.cursor.execute("BEGIN")
+                for statement in statements:
+                    await self.cursor.execute(statement)
+                await self.cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                                          (version, description))
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+
+            current_version = version
+            logging.info(msg=f"Applied migration {version}: {description}")
+
+        return current_version
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def run_in_transaction(self, func):
+        """
+            Runs several writes as one request, so they are committed or rolled back together.
+
+            Args:
+                func: A coroutine function called with a DatabaseManager whose writes all go to the same
+                      transaction.
+
+            Returns:
+                The result of func.
+        """
+        return await func(self)
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
     async def insert_data(self, table_name: str, data: dict):
         """
             Inserts data into the specified table.
@@ -92,6 +234,8 @@ class DatabaseManager:
             VALUES ({placeholders})
         """, values)
 
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
     async def update_data(self, table_name: str, data: dict, identifier: dict):
         """
             Updates data in the specified table based on the given identifier.
@@ -114,6 +258,210 @@ class DatabaseManager:
 
         await self.cursor.execute(query, values)
 
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def update_many(self, table_name: str, rows: list, key: str):
+        """
+            Updates many rows of the specified table with a single executemany call.
+
+            Args:
+                table_name (str): The name of the table to update.
+                rows (list): A list of dictionaries with the same columns, each including the key column.
+                key (str): The column identifying the row to update.
+        """
+        if not rows:
+            return
+
+        columns = [column for column in rows[0].keys() if column != key]
+        set_values = ', '.join([f'{column} = ?' for column in columns])
+        values = [tuple([row[column] for column in columns] + [row[key]]) for row in rows]
+
+        query = f"""
+                    UPDATE {table_name}
+                    SET {set_values}
+                    WHERE {key} = ?
+                 """
+
+        await self.cursor.executemany(query, values)
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def upsert_many(self, table_name: str, rows: list, key: str, update_columns: list = None):
+        """
+            Inserts many rows into the specified table, updating the rows whose key already exists.
+
+            Args:
+                table_name (str): The name of the table to upsert into.
+                rows (list): A list of dictionaries with the same columns, each including the key column.
+                key (str): The primary key or unique column used to detect existing rows.
+                update_columns (list, optional): Columns overwritten for existing rows. Defaults to all non-key columns.
+        """
+        if not rows:
+            return
+
+        columns = list(rows[0].keys())
+        if update_columns is None:
+            update_columns = [column for column in columns if column != key]
+
+        placeholders = ', '.join(['?'] * len(columns))
+        if update_columns:
+            set_values = ', '.join([f'{column} = excluded.{column}' for column in update_columns])
+            conflict_action = f"DO UPDATE SET {set_values}"
+        else:
+            conflict_action = "DO NOTHING"
+        values = [tuple(row[column] for column in columns) for row in rows]
+
+        query = f"""
+                    INSERT INTO {table_name} ({', '.join(columns)})
+                    VALUES ({placeholders})
+                    ON CONFLICT({key}) {conflict_action}
+                 """
+
+        await self.cursor.executemany(query, values)
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes(exclusive=True)
+    async def reconcile_accounts(self, records: list, overrides: dict):
+        """
+            Reconciles accounts and all_accounts with a spreadsheet snapshot using set-based statements.
+
+            The snapshot and the indicators provided through the bot are bulk-loaded into temporary staging
+            tables, and the changes are applied with a few UPDATE ... FROM and INSERT ... SELECT statements in
+            one transaction. Rows whose values did not change are not written. UPDATE ... FROM needs SQLite 3.33.
+
+            Args:
+                records (list): Parsed all_accounts records. For repeated accounts the address of the first
+                                record and the indicator and date of the last one are used, like in upsert_many.
+                overrides (dict): Indicators provided through the bot, keyed by personal account.
+
+            Returns:
+                dict: The numbers of staged records and overrides, of inserted, updated and unchanged
+                registry accounts, and of updated user accounts.
+        """
+        await self.cursor.execute("BEGIN")
+        try:
+            await self.cursor.execute('''
+                                      CREATE TEMP TABLE staging_accounts (
+                                            personal_account TEXT PRIMARY KEY,
+                                            address TEXT,
+                                            last_indicator REAL,
+                                            last_date TEXT
+                                                                         )
+                                      ''')
+            await self.cursor.execute('''
+                                      CREATE TEMP TABLE staging_overrides (
+                                            personal_account TEXT PRIMARY KEY,
+                                            last_indicator REAL
+                                                                          )
+                                      ''')
+
+            await self.cursor.executemany('''
+                                          INSERT INTO staging_accounts VALUES (?, ?, ?, ?)
+                                          ON CONFLICT(personal_account) DO UPDATE SET
+                                              last_indicator = excluded.last_indicator,
+                                              last_date = excluded.last_date
+                                          ''',
+                                          [(record["personal_account"], record["address"], record["last_indicator"],
+                                            record["last_date"]) for record in records])
+            await self.cursor.executemany("INSERT OR REPLACE INTO staging_overrides VALUES (?, ?)",
+                                          list(overrides.items()))
+
+            await self.cursor.execute('''
+                                      UPDATE staging_accounts
+                                      SET last_indicator = overrides.last_indicator
+                                      FROM staging_overrides AS overrides
+                                      WHERE overrides.personal_account = staging_accounts.personal_account
+                                      ''')
+
+            await self.cursor.execute('''
+                                      UPDATE all_accounts
+                                      SET last_indicator = staging.last_indicator,
+                                          last_date = staging.last_date
+                                      FROM staging_accounts AS staging
+                                      WHERE staging.personal_account = all_accounts.personal_account
+                                        AND (all_accounts.last_indicator IS NOT staging.last_indicator
+                                             OR all_accounts.last_date IS NOT staging.last_date)
+                                      ''')
+            updated = self.cursor.rowcount
+
+            await self.cursor.execute('''
+                                      INSERT INTO all_accounts (personal_account, address, last_indicator, last_date)
+                                      SELECT personal_account, address, last_indicator, last_date
+                                      FROM staging_accounts AS staging
+                                      WHERE NOT EXISTS (SELECT 1 FROM all_accounts
+                                                        WHERE all_accounts.personal_account = staging.personal_account)
+                                      ''')
+            inserted = self.cursor.rowcount
+
+            await self.cursor.execute('''
+                                      UPDATE accounts
+                                      SET last_indicator = staging.last_indicator
+                                      FROM staging_accounts AS staging
+                                      WHERE staging.personal_account = accounts.personal_account
+                                        AND accounts.last_indicator IS NOT staging.last_indicator
+                                      ''')
+            accounts_updated = self.cursor.rowcount
+
+            await self.cursor.execute("SELECT count(*) FROM staging_accounts")
+            staged = (await self.cursor.fetchone())[0]
+
+            await self.cursor.execute("DROP TABLE temp.staging_accounts")
+            await self.cursor.execute("DROP TABLE temp.staging_overrides")
+            await self.conn.commit()
+        except Exception:
+            await self.conn.rollback()
+            raise
+
+        return {"staged": staged,
+                "overrides": len(overrides),
+                "inserted": inserted,
+                "updated": updated,
+                "unchanged": staged - inserted - updated,
+                "accounts_updated": accounts_updated}
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def claim_job_window(self, job_name: str, window: str):
+        """
+            Marks a scheduler window of the job as running unless it, or a later window, was already claimed.
+
+            Args:
+                job_name (str): The name of the scheduler job.
+                window (str): The ISO formatted fire time of the window.
+
+            Returns:
+                bool: True if the window was claimed by this call.
+        """
+        await self.cursor.execute("""
+            INSERT INTO scheduler_runs (job_name, last_window, status)
+            VALUES (?, ?, 'running')
+            ON CONFLICT(job_name) DO UPDATE SET last_window = excluded.last_window, status = 'running'
+            WHERE scheduler_runs.last_window < excluded.last_window
+        """, (job_name, window))
+
+        return self.cursor.rowcount > 0
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def claim_job_resume(self, job_name: str, window: str):
+        """
+            Takes over the interrupted run of a scheduler window, marking it as resumed.
+
+            Args:
+                job_name (str): The name of the scheduler job.
+                window (str): The ISO formatted fire time of the interrupted window.
+
+            Returns:
+                bool: True if this call took over the run, False if it was not interrupted or was already resumed.
+        """
+        await self.cursor.execute("""
+            UPDATE scheduler_runs SET status = 'resumed'
+            WHERE job_name = ? AND last_window = ? AND status = 'running'
+        """, (job_name, window))
+
+        return self.cursor.rowcount > 0
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
     async def check_data(self, table_name: str, parameters: dict):
         """
             Checks for data in the specified table based on the given parameters.
@@ -144,6 +492,8 @@ class DatabaseManager:
         else:
             return False
 
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
     async def delete_from_db(self, table_name: str, parameters: dict):
         """
             Deletes rows from the specified table based on the given parameters.
@@ -158,6 +508,54 @@ class DatabaseManager:
 
         await self.cursor.execute(query, (value, ))
 
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def delete_many(self, table_name: str, column: str, values: list):
+        """
+            Deletes the rows of the specified table whose column value is in the given list.
+
+            Args:
+                table_name (str): The name of the table to delete from.
+                column (str): The column to match.
+                values (list): The values identifying the rows to delete.
+        """
+        await self.cursor.executemany(f"DELETE FROM {table_name} WHERE {column} = ?",
+                                      [(value, ) for value in values])
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def delete_older_than(self, table_name: str, column: str, threshold):
+        """
+            Deletes the rows of the specified table whose column value is below the threshold.
+
+            Args:
+                table_name (str): The name of the table to delete from.
+                column (str): The column to compare, usually a timestamp.
+                threshold: The rows with a smaller value are deleted.
+        """
+        await self.cursor.execute(f"DELETE FROM {table_name} WHERE {column} < ?", (threshold, ))
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    async def get_first_rows(self, table_name: str, order_by: str, limit: int):
+        """
+            Retrieves the first rows of the specified table in the given order.
+
+            Args:
+                table_name (str): The name of the table to retrieve data from.
+                order_by (str): The column to order the rows by.
+                limit (int): The maximum number of rows to return.
+
+            Returns:
+                list: A list of dictionaries representing the rows.
+        """
+        await self.cursor.execute(f"SELECT * FROM {table_name} ORDER BY {order_by} LIMIT ?", (limit, ))
+
+        result = await self.cursor.fetchall()
+        columns = [desc[0] for desc in self.cursor.description]
+
+        return [dict(zip(columns, record)) for record in result]
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
     async def get_all_data_from_table(self, table_name: str):
         """
             Retrieves all data from the specified table.
@@ -182,3 +580,90 @@ class DatabaseManager:
             data.append(record_dict)
 
         return data
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    async def get_account(self, personal_account: str):
+        """
+            Looks up an account of the registry by its personal account number, using the primary key.
+
+            Args:
+                personal_account (str): The personal account number.
+
+            Returns:
+                dict|None: The personal account, address, last indicator and last date, or None if it is unknown.
+        """
+        query = ("SELECT personal_account, address, last_indicator, last_date FROM all_accounts "
+                 "WHERE personal_account = ?")
+
+        await self.cursor.execute(query, (personal_account, ))
+        record = await self.cursor.fetchone()
+        if record is None:
+            return None
+
+        columns = [desc[0] for desc in self.cursor.description]
+        return dict(zip(columns, record))
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    async def get_account_numbers(self):
+        """
+            Retrieves the personal account numbers of the registry.
+
+            Returns:
+                set: The personal account numbers of all_accounts.
+        """
+        await self.cursor.execute("SELECT personal_account FROM all_accounts")
+
+        return {record[0] for record in await self.cursor.fetchall()}
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    @writes()
+    async def add_readings(self, readings: list):
+        """
+            Appends readings to the readings ledger, skipping the ones already recorded.
+
+            A reading is identified by its personal account, date and source, so recording the same spreadsheet
+            rows again does not duplicate them. The monthly_consumption aggregates are updated by a trigger.
+
+            Args:
+                readings (list): Dictionaries with personal_account, date ("YYYY-MM-DD HH:MM:SS"), indicator and
+                                 source, and optionally telegram_id and photo_link.
+
+            Returns:
+                int: The number of readings added.
+        """
+        if not readings:
+            return 0
+
+        values = [(reading["personal_account"], reading["date"], reading["indicator"], reading["source"],
+                   reading.get("telegram_id"), reading.get("photo_link")) for reading in readings]
+
+        await self.cursor.executemany("""
+            INSERT INTO readings (personal_account, date, indicator, source, telegram_id, photo_link)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(personal_account, date, source) DO NOTHING
+        """, values)
+
+        return self.cursor.rowcount
+
+    @timed(DB_DURATION, DB_ERRORS, label="method")
+    async def get_monthly_consumption(self, personal_account: str, months: int = 12):
+        """
+            Retrieves the precomputed monthly consumption of an account.
+
+            Args:
+                personal_account (str): The personal account number.
+                months (int): The maximum number of months returned.
+
+            Returns:
+                list: Dictionaries with the month ("YYYY-MM"), the number of readings, the last indicator and the
+                consumption of each month with readings, newest first.
+        """
+        await self.cursor.execute("""
+            SELECT month, readings, last_indicator, consumption FROM monthly_consumption
+            WHERE personal_account = ?
+            ORDER BY month DESC
+            LIMIT ?
+        """, (personal_account, months))
+
+        columns = [description[0] for description in self.cursor.description]
+        return [dict(zip(columns, record)) for record in await self.cursor.fetchall()]
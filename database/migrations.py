@@ -0,0 +1,136 @@
+"""
+This module contains the ordered schema migrations applied to the SQLite database at startup.
+
+Each migration is a tuple of a version number, a short description and the SQL statements to run.
+Versions must only ever be appended: a migration that was shipped is never edited, a new one is added instead.
+"""
+
+
+MIGRATIONS = [
+    (1, "Covering index for accounts lookups by telegram_id", [
+        """
+        CREATE INDEX IF NOT EXISTS idx_accounts_telegram_id
+        ON accounts (telegram_id, personal_account, address, last_date, last_indicator)
+        """,
+    ]),
+    (2, "Delivery log of broadcasts for resuming interrupted ones", [
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id TEXT NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            PRIMARY KEY (broadcast_id, telegram_id)
+        )
+        """,
+    ]),
+    (3, "Run state of scheduler jobs", [
+        """
+        CREATE TABLE IF NOT EXISTS scheduler_runs (
+            job_name TEXT PRIMARY KEY,
+            last_window TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+        """,
+    ]),
+    (4, "Outbox of rows waiting to be appended to the user input spreadsheet", [
+        """
+        CREATE TABLE IF NOT EXISTS sheet_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (5, "FSM storage of conversation states and data", [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at
+        ON fsm_storage (updated_at)
+        """,
+    ]),
+    (6, "Readings ledger with monthly consumption aggregates maintained by a trigger", [
+        """
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            personal_account TEXT NOT NULL,
+            date TEXT NOT NULL,
+            indicator REAL NOT NULL,
+            source TEXT NOT NULL,
+            telegram_id INTEGER,
+            photo_link TEXT
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_readings_account_date
+        ON readings (personal_account, date, source)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS monthly_consumption (
+            personal_account TEXT NOT NULL,
+            month TEXT NOT NULL,
+            readings INTEGER NOT NULL,
+            first_date TEXT NOT NULL,
+            first_indicator REAL NOT NULL,
+            last_date TEXT NOT NULL,
+            last_indicator REAL NOT NULL,
+            consumption REAL,
+            PRIMARY KEY (personal_account, month)
+        )
+        """,
+        # The consumption of a month is its last reading minus the last reading of the previous month with
+        # readings, or minus its own first reading if there is none. A reading changes the consumption of its
+        # month and of the next month with readings, so only those two are recalculated.
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_readings_monthly_consumption
+        AFTER INSERT ON readings
+        BEGIN
+            INSERT INTO monthly_consumption (personal_account, month, readings, first_date, first_indicator,
+                                             last_date, last_indicator)
+            VALUES (NEW.personal_account, substr(NEW.date, 1, 7), 1, NEW.date, NEW.indicator, NEW.date,
+                    NEW.indicator)
+            ON CONFLICT (personal_account, month) DO UPDATE SET
+                readings = readings + 1,
+                first_date = min(first_date, excluded.first_date),
+                first_indicator = CASE WHEN excluded.first_date < first_date
+                                       THEN excluded.first_indicator ELSE first_indicator END,
+                last_date = max(last_date, excluded.last_date),
+                last_indicator = CASE WHEN excluded.last_date >= last_date
+                                      THEN excluded.last_indicator ELSE last_indicator END;
+
+            UPDATE monthly_consumption
+            SET consumption = last_indicator - coalesce(
+                    (SELECT previous.last_indicator FROM monthly_consumption AS previous
+                     WHERE previous.personal_account = monthly_consumption.personal_account
+                       AND previous.month < monthly_consumption.month
+                     ORDER BY previous.month DESC LIMIT 1),
+                    first_indicator)
+            WHERE personal_account = NEW.personal_account
+              AND month >= substr(NEW.date, 1, 7)
+              AND month <= coalesce((SELECT min(month) FROM monthly_consumption
+                                     WHERE personal_account = NEW.personal_account
+                                       AND month > substr(NEW.date, 1, 7)),
+                                    substr(NEW.date, 1, 7));
+        END
+        """,
+        # Makes the next incremental sync treat every spreadsheet row as changed, so the ledger is filled with
+        # the whole history of the spreadsheet.
+        "DELETE FROM sync_row_hashes",
+        "DELETE FROM sync_state",
+    ]),
+    (7, "Local mirror of the indicators provided through the user input spreadsheet", [
+        """
+        CREATE TABLE IF NOT EXISTS user_input_mirror (
+            personal_account TEXT PRIMARY KEY,
+            indicator TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    ]),
+]
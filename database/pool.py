@@ -0,0 +1,156 @@
+"""
+This module contains the ConnectionPool class for sharing long-lived SQLite connections between DatabaseManager instances.
+"""
+
+import asyncio
+import logging
+import time
+
+import aiosqlite
+
+
+_pools = {}
+
+
+def get_pool(db_name: str):
+    """
+        Returns the pool registered for the given database, if any.
+
+        Args:
+            db_name (str): The name of the SQLite database file.
+
+        Returns:
+            ConnectionPool|None: The registered pool or None when connections are opened per call.
+    """
+    return _pools.get(db_name)
+
+
+class ConnectionPool:
+    """
+       A fixed-size pool of long-lived aiosqlite connections.
+
+       Each aiosqlite connection owns a worker thread, so opening one per query is expensive. The pool opens
+       its connections once, hands them out to DatabaseManager instances and checks idle connections with a
+       cheap query before reusing them.
+    """
+    def __init__(self, db_name: str, size: int = 5, health_check_interval: float = 30.0):
+        """
+            Initialize the pool.
+
+            Args:
+                db_name (str): The name of the SQLite database file.
+                size (int): The number of connections kept open.
+                health_check_interval (float): Seconds a connection may stay idle before it is checked on lease.
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.db_name = db_name
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self._idle = asyncio.Queue()
+        self._connections = set()
+        self._closed = True
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.db_name)
+        self._connections.add(conn)
+        return conn
+
+    async def _discard(self, conn):
+        self._connections.discard(conn)
+        try:
+            await conn.close()
+        except Exception as e:
+            logging.error(msg=f"Failed to close pooled connection: {e}")
+
+    async def open(self):
+        """
+            Opens all connections and registers the pool so DatabaseManager starts leasing from it.
+        """
+        if not self._closed:
+            return
+
+        for _ in range(self.size):
+            self._idle.put_nowait((await self._connect(), time.monotonic()))
+
+        self._closed = False
+        _pools[self.db_name] = self
+        logging.info(msg=f"Connection pool for {self.db_name} opened with {self.size} connections")
+
+    async def close(self):
+        """
+            Unregisters the pool and closes every connection it owns.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        if _pools.get(self.db_name) is self:
+            del _pools[self.db_name]
+
+        for conn in list(self._connections):
+            await self._discard(conn)
+
+        while not self._idle.empty():
+            self._idle.get_nowait()
+
+    async def is_healthy(self, conn) -> bool:
+        """
+            Checks that a connection can still run queries.
+
+            Args:
+                conn (aiosqlite.Connection): The connection to check.
+
+            Returns:
+                bool: True if the connection answered the check query.
+        """
+        try:
+            async with conn.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+            return True
+        except Exception as e:
+            logging.error(msg=f"Pooled connection to {self.db_name} failed health check: {e}")
+            return False
+
+    async def acquire(self):
+        """
+            Leases a connection from the pool, waiting if all of them are in use.
+
+            Returns:
+                aiosqlite.Connection: A healthy connection.
+        """
+        if self._closed:
+            raise RuntimeError(f"Connection pool for {self.db_name} is closed")
+
+        conn, last_used = await self._idle.get()
+        if time.monotonic() - last_used > self.health_check_interval and not await self.is_healthy(conn):
+            await self._discard(conn)
+            conn = await self._connect()
+
+        return conn
+
+    async def release(self, conn, discard: bool = False):
+        """
+            Returns a leased connection to the pool.
+
+            Args:
+                conn (aiosqlite.Connection): The connection obtained from acquire().
+                discard (bool): Replace the connection with a new one instead of reusing it.
+        """
+        if self._closed:
+            await self._discard(conn)
+            return
+
+        if discard:
+            await self._discard(conn)
+            conn = await self._connect()
+
+        self._idle.put_nowait((conn, time.monotonic()))
@@ -0,0 +1,82 @@
+"""
+This module contains the AccountRegistry used to validate the personal account numbers entered by users.
+
+Accounts are looked up by primary key in the all_accounts table. Optionally the registry keeps the set of
+known account numbers in memory, so numbers that are not in the registry are rejected without a query. The
+set is loaded on first use and extended by the spreadsheet synchronization, which is the only writer of
+all_accounts. It is reloaded after ACCOUNT_FILTER_TTL seconds, so accounts synchronized by another process
+sharing the database are picked up as well.
+"""
+
+import asyncio
+import time
+
+from bot.metrics import CACHE_REQUESTS
+from bot.settings import DB_NAME, ACCOUNT_FILTER_ENABLED, ACCOUNT_FILTER_TTL
+from database.main import DatabaseManager
+
+
+class AccountRegistry:
+    """
+       Point lookups of registry accounts with an optional in-memory filter of the known account numbers.
+    """
+    def __init__(self, db_name: str, use_filter: bool = True, filter_ttl: float = 600):
+        """
+            Initialize the registry.
+
+            Args:
+                db_name (str): The name of the SQLite database file.
+                use_filter (bool): Keep the known account numbers in memory to reject unknown ones without a query.
+                filter_ttl (float): Seconds after which the account numbers are reloaded from the database.
+        """
+        self.db_name = db_name
+        self.use_filter = use_filter
+        self.filter_ttl = filter_ttl
+        self._numbers = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_filter_stale(self) -> bool:
+        return self._numbers is None or time.monotonic() - self._loaded_at > self.filter_ttl
+
+    async def _load_filter(self):
+        async with self._lock:
+            if self._is_filter_stale():
+                async with DatabaseManager(self.db_name) as db:
+                    self._numbers = await db.get_account_numbers()
+                self._loaded_at = time.monotonic()
+
+    def add(self, personal_accounts):
+        """
+            Adds account numbers written to all_accounts to the filter.
+
+            Args:
+                personal_accounts: An iterable of personal account numbers.
+        """
+        if self._numbers is not None:
+            self._numbers.update(personal_accounts)
+
+    async def get_account(self, personal_account: str):
+        """
+            Returns the registry account with the given number.
+
+            Args:
+                personal_account (str): The personal account number.
+
+            Returns:
+                dict|None: The personal account, address, last indicator and last date, or None if it is unknown.
+        """
+        if self.use_filter:
+            if self._is_filter_stale():
+                await self._load_filter()
+
+            if personal_account not in self._numbers:
+                CACHE_REQUESTS.inc(cache="account_filter", result="rejected")
+                return None
+            CACHE_REQUESTS.inc(cache="account_filter", result="passed")
+
+        async with DatabaseManager(self.db_name) as db:
+            return await db.get_account(personal_account)
+
+
+account_registry = AccountRegistry(DB_NAME, use_filter=ACCOUNT_FILTER_ENABLED, filter_ttl=ACCOUNT_FILTER_TTL)
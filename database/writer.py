@@ -0,0 +1,229 @@
+"""
+This module contains the DatabaseWriter class, the single owner of the write connection to an SQLite database.
+
+SQLite allows one writer at a time, so instead of every DatabaseManager committing on its own connection, the
+write methods of DatabaseManager submit their work to the writer registered for the database. The writer runs
+the queued requests one after another on its own connection and group-commits everything queued within
+DB_WRITER_COMMIT_WINDOW seconds in one transaction. Every request runs in its own savepoint, so a failing
+request is rolled back without affecting the others in the batch, and its caller is resumed only after the
+transaction is committed. The database is switched to WAL mode, so the pooled read connections keep reading
+while the writer commits.
+"""
+
+import asyncio
+import logging
+
+import aiosqlite
+
+from bot.metrics import DB_WRITER_BATCH
+
+
+_writers = {}
+
+
+def get_writer(db_name: str):
+    """
+        Returns the writer registered for the given database, if any.
+
+        Args:
+            db_name (str): The name of the SQLite database file.
+
+        Returns:
+            DatabaseWriter|None: The registered writer or None when every connection writes on its own.
+    """
+    return _writers.get(db_name)
+
+
+class DatabaseWriter:
+    """
+       An actor that owns the write connection of a database and group-commits the write requests it receives.
+    """
+    def __init__(self, db_name: str, commit_window: float = 0.005, max_batch: int = 100):
+        """
+            Initialize the writer.
+
+            Args:
+                db_name (str): The name of the SQLite database file.
+                commit_window (float): Seconds to wait for more requests before committing a batch.
+                max_batch (int): The maximum number of requests committed in one transaction.
+        """
+        if max_batch < 1:
+            raise ValueError("Writer batch size must be at least 1")
+
+        self.db_name = db_name
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self.connection = None
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._closed = True
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self):
+        """
+            Opens the write connection, switches the database to WAL mode and starts processing requests.
+        """
+        if not self._closed:
+            return
+
+        self.connection = await aiosqlite.connect(self.db_name)
+        await self.connection.execute("PRAGMA journal_mode=WAL")
+        await self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._on_stopped)
+        _writers[self.db_name] = self
+        logging.info(msg=f"Database writer for {self.db_name} started")
+
+    async def close(self):
+        """
+            Unregisters the writer, commits the requests still queued and closes the write connection.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        if _writers.get(self.db_name) is self:
+            del _writers[self.db_name]
+
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        await self.connection.close()
+        self.connection = None
+
+    def _on_stopped(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+
+        error = task.exception() or RuntimeError("Database writer stopped")
+        logging.critical(msg=f"Database writer for {self.db_name} stopped unexpectedly: {error}")
+        self._closed = True
+        if _writers.get(self.db_name) is self:
+            del _writers[self.db_name]
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(error)
+            self._queue.task_done()
+
+    async def submit(self, operation, exclusive: bool = False):
+        """
+            Queues a write request and waits until it is committed.
+
+            Args:
+                operation: A coroutine function called with the write connection.
+                exclusive (bool): Run the operation outside of a batch, for operations that manage their own
+                                  transaction.
+
+            Returns:
+                The result of the operation.
+
+            Raises:
+                RuntimeError: If the writer is closed.
+        """
+        if self._closed:
+            raise RuntimeError(f"Database writer for {self.db_name} is closed")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, exclusive, future))
+        return await future
+
+    def _take_nowait(self, batch: list):
+        while len(batch) < self.max_batch and not self._queue.empty():
+            request = self._queue.get_nowait()
+            if request[1]:
+                # Exclusive requests are never mixed into a batch; they run after it is committed.
+                return request
+            batch.append(request)
+
+        return None
+
+    async def _run(self):
+        deferred = None
+        while True:
+            request = deferred or await self._queue.get()
+            deferred = None
+            batch = [request]
+
+            try:
+                if request[1]:
+                    await self._run_exclusive(request)
+                    continue
+
+                deferred = self._take_nowait(batch)
+                if deferred is None and self.commit_window > 0 and len(batch) < self.max_batch:
+                    await asyncio.sleep(self.commit_window)
+                    deferred = self._take_nowait(batch)
+
+                await self._commit_batch(batch)
+            except Exception as e:
+                # The writer must outlive any failure, or every later submit() would wait forever.
+                logging.error(msg=f"Database writer failed to run {len(batch)} requests: {e}")
+                await self._fail(batch, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _fail(self, batch: list, error: Exception):
+        try:
+            if self.connection.in_transaction:
+                await self.connection.rollback()
+        except Exception as e:
+            logging.error(msg=f"Database writer failed to roll back: {e}")
+
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run_exclusive(self, request: tuple):
+        operation, _, future = request
+        try:
+            result = await operation(self.connection)
+        except Exception as e:
+            await self._fail([request], e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _commit_batch(self, batch: list):
+        results = []
+        try:
+            await self.connection.execute("BEGIN IMMEDIATE")
+            for index, (operation, _, future) in enumerate(batch):
+                savepoint = f"request_{index}"
+                await self.connection.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    result = await operation(self.connection)
+                except Exception as e:
+                    await self.connection.execute(f"ROLLBACK TO {savepoint}")
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                await self.connection.execute(f"RELEASE {savepoint}")
+
+            await self.connection.commit()
+        except Exception as e:
+            logging.error(msg=f"Database writer failed to commit {len(batch)} requests: {e}")
+            await self._fail(batch, e)
+            return
+
+        DB_WRITER_BATCH.observe(len(batch))
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -1,7 +1,9 @@
 import asyncio
 
-from bot.functions import start_program
-
 
 if __name__ == "__main__":
+    # Imported here, because the photo worker processes are spawned and import this module again: they must not
+    # load the bot, its settings and its logging.
+    from bot.functions import start_program
+
     asyncio.run(start_program())
@@ -0,0 +1,122 @@
+"""
+This module contains the dedicated thread pools used for blocking Google API calls.
+
+googleapiclient requests block, so they run in worker threads. Instead of sharing the event loop's default
+executor, the calls are split into two lanes with their own workers: the interactive lane serves work done
+on behalf of users (photo uploads, appended readings) and the background lane serves the periodic
+spreadsheet synchronization, so a long sheet download can never delay a user's upload.
+"""
+
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.metrics import Gauge, registry
+from bot.settings import GOOGLE_INTERACTIVE_WORKERS, GOOGLE_BACKGROUND_WORKERS
+
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class GoogleExecutor:
+    """
+       Runs blocking calls in per-lane thread pools and counts queued, running and completed calls.
+    """
+    def __init__(self, interactive_workers: int, background_workers: int):
+        """
+            Initialize the executor.
+
+            Args:
+                interactive_workers (int): The number of threads serving interactive calls.
+                background_workers (int): The number of threads serving background calls.
+        """
+        self._executors = {
+            INTERACTIVE: ThreadPoolExecutor(max_workers=interactive_workers, thread_name_prefix="google-interactive"),
+            BACKGROUND: ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix="google-background"),
+        }
+        self._workers = {INTERACTIVE: interactive_workers, BACKGROUND: background_workers}
+        self._counters = {lane: {"queued": 0, "running": 0, "completed": 0, "failed": 0} for lane in self._executors}
+        self._lock = threading.Lock()
+
+    def _call(self, lane: str, func):
+        with self._lock:
+            self._counters[lane]["queued"] -= 1
+            self._counters[lane]["running"] += 1
+
+        succeeded = False
+        try:
+            result = func()
+            succeeded = True
+            return result
+        finally:
+            with self._lock:
+                self._counters[lane]["running"] -= 1
+                self._counters[lane]["completed" if succeeded else "failed"] += 1
+
+    async def run(self, lane: str, func):
+        """
+            Runs a blocking function in the thread pool of the lane.
+
+            Args:
+                lane (str): INTERACTIVE or BACKGROUND.
+                func: A function without arguments.
+
+            Returns:
+                The result of the function.
+        """
+        with self._lock:
+            self._counters[lane]["queued"] += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors[lane], self._call, lane, func)
+
+    async def run_interactive(self, func):
+        """
+            Runs a blocking function done on behalf of a user.
+
+            Args:
+                func: A function without arguments.
+
+            Returns:
+                The result of the function.
+        """
+        return await self.run(INTERACTIVE, func)
+
+    async def run_background(self, func):
+        """
+            Runs a blocking function of a periodic background job.
+
+            Args:
+                func: A function without arguments.
+
+            Returns:
+                The result of the function.
+        """
+        return await self.run(BACKGROUND, func)
+
+    def stats(self):
+        """
+            Returns the queue depth and call counters of every lane.
+
+            Returns:
+                dict: Workers, queued, running, completed and failed calls keyed by lane.
+        """
+        with self._lock:
+            return {lane: {"workers": self._workers[lane], **counters} for lane, counters in self._counters.items()}
+
+    def shutdown(self):
+        """
+            Stops the thread pools after the submitted calls finish.
+        """
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+
+
+google_executor = GoogleExecutor(interactive_workers=GOOGLE_INTERACTIVE_WORKERS,
+                                 background_workers=GOOGLE_BACKGROUND_WORKERS)
+registry.register(Gauge("bot_google_executor_calls", "Calls of the Google executor lanes by status.",
+                        ("lane", "status"), callback=lambda: {(lane, status): value
+                                                             for lane, counters in google_executor.stats().items()
+                                                             for status, value in counters.items()}))
@@ -1,32 +1,121 @@
 """
 This module contains functions for Google API integration, including saving photos and interacting with Google Sheets and Google Drive.
+
+The Google client libraries, the service account credentials and the API clients are loaded on first use and
+cached, so importing this module (and the handlers that use it) does not pay for them. The API clients are
+built from the discovery documents bundled with google-api-python-client, without network requests. Requests
+are built and executed in the executor threads, so a client that is still missing because the warm-up has
+not finished is built there as well, and never on the event loop thread.
 """
 
 
-import os
-import asyncio
+import functools
+import logging
+import tempfile
+import threading
+import time
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 from bot.main import bot
+from bot.metrics import GOOGLE_DURATION, GOOGLE_ERRORS, PHOTO_BYTES_SAVED, timed
+from bot.settings import PHOTO_SPOOL_THRESHOLD, PHOTO_TARGET_SIZE, PHOTO_JPEG_QUALITY, PHOTO_PROCESS_WORKERS
+from google_spreadsheets.executor import google_executor
+from google_spreadsheets.photos import PhotoProcessor, choose_photo_size
 
 
 # Define your service account file path and other constants
 SERVICE_ACCOUNT_FILE = ''  # add path to you auth json file
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-sheets_service = build('sheets', 'v4', credentials=credentials)
-drive_service = build('drive', 'v3', credentials=credentials)
 all_users_info_spreadsheet_id = ''  # spreadsheet ID for historical data storage
 users_input_spreadsheet_id = ''  # spreadsheet ID for user's inputs
 photo_folder_id = ''  # folder ID for user's photo storage
+_thread_local = threading.local()
+photo_processor = PhotoProcessor(workers=PHOTO_PROCESS_WORKERS)
+
+
+@functools.lru_cache(maxsize=None)
+def get_credentials():
+    """
+        Load the service account credentials on first use.
+
+        Returns:
+            Credentials: The service account credentials with the Sheets and Drive scopes.
+    """
+    from google.oauth2.service_account import Credentials
+
+    return Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+
+
+def _build_service(service_name: str, version: str):
+    from googleapiclient.discovery import build
+
+    start = time.perf_counter()
+    service = build(service_name, version, credentials=get_credentials(), static_discovery=True,
+                    cache_discovery=False)
+    logging.info(msg=f"Google {service_name} {version} client built in {round(time.perf_counter() - start, 3)} seconds")
+
+    return service
+
+
+@functools.lru_cache(maxsize=None)
+def get_sheets_service():
+    """
+        Build the Google Sheets client on first use.
 
+        Returns:
+            Resource: The Sheets v4 client.
+    """
+    return _build_service('sheets', 'v4')
+
+
+@functools.lru_cache(maxsize=None)
+def get_drive_service():
+    """
+        Build the Google Drive client on first use.
+
+        Returns:
+            Resource: The Drive v3 client.
+    """
+    return _build_service('drive', 'v3')
+
+
+def get_thread_http():
+    """
+        Return the authorized HTTP client of the current worker thread.
+
+        httplib2 connections are not thread-safe, so every executor thread executes requests with its own client.
+
+        Returns:
+            AuthorizedHttp: The HTTP client of the current thread.
+    """
+    if not hasattr(_thread_local, "http"):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
 
+        _thread_local.http = AuthorizedHttp(get_credentials(), http=httplib2.Http())
+
+    return _thread_local.http
+
+
+async def warm_up_google_clients():
+    """
+        Build the Google clients in the background executor, so the first user request does not wait for them.
+    """
+    try:
+        await google_executor.run_background(lambda: (get_sheets_service(), get_drive_service()))
+    except Exception as e:
+        logging.error(msg=f"Can't build Google API clients: {e}")
+
+
+@timed(GOOGLE_DURATION, GOOGLE_ERRORS)
 async def save_photo(file_name, message):
     """
         Save a photo from a message to Google Drive.
 
+        The smallest Telegram size of the photo that reaches PHOTO_TARGET_SIZE is downloaded, and downscaled in
+        the photo processor when it is still much larger. The photo is downloaded into memory and streamed to
+        Drive from there. Photos larger than PHOTO_SPOOL_THRESHOLD bytes spill over to an anonymous temporary file
+        and are uploaded in chunks. The bytes saved compared with the largest size are recorded per upload.
+
         Args:
             file_name (str): The name to be used for the saved file.
             message: The message containing the photo.
@@ -34,25 +123,46 @@ async def save_photo(file_name, message):
         Returns:
             str: The web link to the saved photo on Google Drive.
     """
-    photo_file = message.photo[-1].file_id
-    file = await bot.get_file(photo_file)
+    photo, resize = choose_photo_size(message.photo, PHOTO_TARGET_SIZE)
+    file = await bot.get_file(photo.file_id)
     file_path = file.file_path
-    local_path = f"{file_name}.jpeg"
-    await bot.download_file(file_path, destination=local_path)
-
-    media = MediaFileUpload(local_path, mimetype='image/jpeg')
-    file_metadata = {
-        'name': f'{file_name}.jpeg',
-        'parents': [photo_folder_id]
-    }
-    loop = asyncio.get_event_loop()
-    file_drive = await loop.run_in_executor(None,
-                                            lambda: drive_service.files().create(body=file_metadata,
-                                                                                 media_body=media,
-                                                                                 fields='id, webViewLink').execute())
+
+    with tempfile.SpooledTemporaryFile(max_size=PHOTO_SPOOL_THRESHOLD) as buffer:
+        await bot.download_file(file_path, destination=buffer)
+        if resize:
+            data = await photo_processor.downscale(buffer.read(), target=PHOTO_TARGET_SIZE,
+                                                   quality=PHOTO_JPEG_QUALITY)
+            buffer.seek(0)
+            buffer.truncate()
+            buffer.write(data)
+            buffer.seek(0)
+
+        buffer.seek(0, 2)
+        uploaded_size = buffer.tell()
+        buffer.seek(0)
+        resumable = uploaded_size > PHOTO_SPOOL_THRESHOLD
+        original_size = message.photo[-1].file_size or uploaded_size
+        method = "resized" if resize else "original" if photo is message.photo[-1] else "telegram_size"
+
+        file_metadata = {
+            'name': f'{file_name}.jpeg',
+            'parents': [photo_folder_id]
+        }
+
+        def upload():
+            from googleapiclient.http import MediaIoBaseUpload
+
+            media = MediaIoBaseUpload(buffer, mimetype='image/jpeg', resumable=resumable)
+            request = get_drive_service().files().create(body=file_metadata, media_body=media,
+                                                         fields='id, webViewLink')
+            return request.execute(http=get_thread_http())
+
+        file_drive = await google_executor.run_interactive(upload)
+
+        PHOTO_BYTES_SAVED.observe(max(original_size - uploaded_size, 0), method=method)
+        logging.info(msg=f"Photo {file_name} uploaded with {uploaded_size} of {original_size} bytes ({method})")
 
     file_link = file_drive.get('webViewLink')
-    os.remove(local_path)
 
     return file_link
 
@@ -64,20 +174,32 @@ async def save_data_to_sheet(data: list):
         Args:
             data (list): A list of data to be saved in the sheet.
     """
-    values = [data]
+    await save_rows_to_sheet(rows=[data])
+
+
+@timed(GOOGLE_DURATION, GOOGLE_ERRORS)
+async def save_rows_to_sheet(rows: list):
+    """
+        Save several rows to a Google Sheet with a single append request.
+
+        Args:
+            rows (list): A list of rows, each a list of data to be saved in the sheet.
+    """
     range_ = 'A:E'
     value_input_option = 'USER_ENTERED'
-    body = {'values': values}
+    body = {'values': rows}
 
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None,
-                               lambda: sheets_service.spreadsheets().values().append(
-                                   spreadsheetId=users_input_spreadsheet_id,
-                                   range=range_,
-                                   valueInputOption=value_input_option,
-                                   body=body).execute())
+    def append():
+        request = get_sheets_service().spreadsheets().values().append(spreadsheetId=users_input_spreadsheet_id,
+                                                                      range=range_,
+                                                                      valueInputOption=value_input_option,
+                                                                      body=body)
+        return request.execute(http=get_thread_http())
 
+    await google_executor.run_interactive(append)
 
+
+@timed(GOOGLE_DURATION, GOOGLE_ERRORS)
 async def get_data_from_sheet(user_input: bool = False):
     """
         Retrieve data from a Google Sheet.
@@ -89,17 +211,39 @@ async def get_data_from_sheet(user_input: bool = False):
             list: A list of retrieved data from the sheet.
     """
     if user_input:
-        range_ = 'A:F'
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, lambda: sheets_service.spreadsheets().values().get(
-            spreadsheetId=users_input_spreadsheet_id, range=range_).execute())
+        spreadsheet_id, range_ = users_input_spreadsheet_id, 'A:F'
 
     else:
-        range_ = 'A:J'
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, lambda: sheets_service.spreadsheets().values().get(
-            spreadsheetId=all_users_info_spreadsheet_id, range=range_).execute())
+        spreadsheet_id, range_ = all_users_info_spreadsheet_id, 'A:J'
+
+    def download():
+        request = get_sheets_service().spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range_)
+        return request.execute(http=get_thread_http())
+
+    result = await google_executor.run_background(download)
 
     values = result.get('values', [])
 
     return values[1:]
+
+
+@timed(GOOGLE_DURATION, GOOGLE_ERRORS)
+async def get_sheet_revision(user_input: bool = False):
+    """
+        Retrieve the current Drive revision of a Google Sheet.
+
+        Args:
+            user_input (bool): Whether to check the user input spreadsheet.
+
+        Returns:
+            str: The file version, which increases every time the spreadsheet changes.
+    """
+    spreadsheet_id = users_input_spreadsheet_id if user_input else all_users_info_spreadsheet_id
+
+    def get_version():
+        request = get_drive_service().files().get(fileId=spreadsheet_id, fields='version')
+        return request.execute(http=get_thread_http())
+
+    result = await google_executor.run_background(get_version)
+
+    return result.get('version')
@@ -0,0 +1,167 @@
+"""
+This module contains the local mirror of the indicators provided through the user input spreadsheet.
+
+Every row of the user input spreadsheet is appended by the bot, so the synchronization does not need to
+download the spreadsheet to know the latest indicator provided for each account. The outbox writes the
+indicator to the user_input_mirror table in the same transaction that queues the row, and the
+synchronization reads its overrides from there. Every change of the mirror also stores a new mirror version
+in the sync_state table, so the incremental synchronization can tell whether the mirror changed without
+reading it.
+
+A separate scheduler job reconciles the mirror with the spreadsheet on USER_INPUT_RECONCILE_SCHEDULE, so
+manual edits of the spreadsheet are picked up as well. Accounts with rows still waiting in the outbox, or
+provided while the spreadsheet was being downloaded, keep their mirrored indicator during a reconciliation,
+since the downloaded spreadsheet does not have it yet.
+"""
+
+import json
+import logging
+import time
+
+from bot.settings import DB_NAME
+from database.main import DatabaseManager
+from google_spreadsheets.functions import get_data_from_sheet
+
+
+RECONCILED_KEY = "user_input_mirror_reconciled_at"
+VERSION_KEY = "user_input_mirror_version"
+
+
+def get_mirror_row(row: list):
+    """
+        Converts a row appended to the user input spreadsheet into a user_input_mirror record.
+
+        Args:
+            row (list): The row values in the A:F order: indicator, account, address, Telegram ID, date, photo.
+
+        Returns:
+            dict: The personal account, the indicator as text and the time of the change.
+    """
+    # The account is written with a leading apostrophe so the spreadsheet keeps it as text.
+    return {"personal_account": str(row[1]).lstrip("'"),
+            "indicator": str(row[0]),
+            "updated_at": time.time()}
+
+
+def get_version_row():
+    """
+        Creates the sync_state record of a new mirror version, written together with every change of the mirror.
+
+        Returns:
+            dict: The key and value of the record.
+    """
+    return {"key": VERSION_KEY, "value": f"{time.time():.6f}"}
+
+
+def get_latest_indicators(rows: list):
+    """
+        Collects the latest indicator of every account from the rows of the user input spreadsheet.
+
+        Args:
+            rows (list): The rows of the A:F range, oldest first.
+
+        Returns:
+            dict: Indicators keyed by personal account.
+    """
+    return {row[1]: row[0] for row in rows if len(row) > 1}
+
+
+class UserInputMirror:
+    """
+       The indicators provided for every account, mirrored in SQLite from the user input spreadsheet.
+    """
+    def __init__(self, db_name: str):
+        """
+            Initialize the mirror.
+
+            Args:
+                db_name (str): The name of the SQLite database file.
+        """
+        self.db_name = db_name
+        self._reconciled = False
+
+    async def _get_state(self):
+        async with DatabaseManager(self.db_name) as db:
+            sync_state = {row["key"]: row["value"] for row in
+                          await db.get_all_data_from_table(table_name="sync_state")}
+
+        # A mirror that was never reconciled misses the rows appended before it existed.
+        if RECONCILED_KEY not in sync_state:
+            await self.reconcile()
+            return await self._get_state()
+
+        self._reconciled = True
+        return sync_state
+
+    async def get_version(self):
+        """
+            Reads the current version of the mirror, reconciling the mirror first if it was never filled.
+
+            Returns:
+                str: A value that changes whenever the mirror changes.
+        """
+        sync_state = await self._get_state()
+        return sync_state.get(VERSION_KEY, "")
+
+    async def read(self):
+        """
+            Reads the mirrored indicators, reconciling the mirror first if it was never filled.
+
+            Returns:
+                dict: Indicators keyed by personal account.
+        """
+        if not self._reconciled:
+            await self._get_state()
+
+        async with DatabaseManager(self.db_name) as db:
+            rows = await db.get_all_data_from_table(table_name="user_input_mirror")
+
+        return {row["personal_account"]: row["indicator"] for row in rows}
+
+    async def reconcile(self):
+        """
+            Downloads the user input spreadsheet and brings the mirror in line with it.
+
+            Returns:
+                dict: The numbers of spreadsheet accounts and of added, changed, removed and kept indicators.
+        """
+        started = time.time()
+        sheet_indicators = get_latest_indicators(await get_data_from_sheet(user_input=True))
+        summary = {"accounts": len(sheet_indicators), "added": 0, "changed": 0, "removed": 0, "kept": 0}
+
+        async def write_changes(writer_db: DatabaseManager):
+            mirror = {row["personal_account"]: row for row in
+                      await writer_db.get_all_data_from_table(table_name="user_input_mirror")}
+            queued = {get_mirror_row(json.loads(record["payload"]))["personal_account"] for record in
+                      await writer_db.get_all_data_from_table(table_name="sheet_outbox")}
+            kept = queued | {account for account, row in mirror.items() if row["updated_at"] >= started}
+
+            upserts = []
+            for account, indicator in sheet_indicators.items():
+                if account in kept or (account in mirror and mirror[account]["indicator"] == str(indicator)):
+                    continue
+
+                summary["changed" if account in mirror else "added"] += 1
+                upserts.append({"personal_account": account, "indicator": str(indicator), "updated_at": time.time()})
+
+            removed = [account for account in mirror if account not in sheet_indicators and account not in kept]
+            summary["removed"] = len(removed)
+            summary["kept"] = len(kept & (set(mirror) | set(sheet_indicators)))
+
+            state = [{"key": RECONCILED_KEY, "value": str(started)}]
+            if upserts or removed:
+                state.append(get_version_row())
+
+            await writer_db.upsert_many(table_name="user_input_mirror", rows=upserts, key="personal_account")
+            await writer_db.delete_many(table_name="user_input_mirror", column="personal_account", values=removed)
+            await writer_db.upsert_many(table_name="sync_state", rows=state, key="key")
+
+        async with DatabaseManager(self.db_name) as db:
+            await db.run_in_transaction(write_changes)
+
+        self._reconciled = True
+        logging.info(msg=f"User input mirror reconciled: {summary}")
+        return summary
+
+
+user_input_mirror = UserInputMirror(DB_NAME)
@@ -0,0 +1,120 @@
+"""
+This module contains the write-behind outbox for rows appended to the user input spreadsheet.
+
+Handlers store confirmed readings in the sheet_outbox table and answer the user as soon as the row is
+committed. A background task appends the pending rows to the spreadsheet in one request every
+SHEET_OUTBOX_FLUSH_INTERVAL seconds, or earlier once SHEET_OUTBOX_BATCH_SIZE rows are waiting, and removes
+them from the outbox only after the append succeeded. Failed appends, such as quota errors, are retried with
+exponential backoff, and rows left in the outbox by a restart are sent by the next flush. The indicator of a
+queued row is written to the local user input mirror in the same transaction.
+"""
+
+import asyncio
+import json
+import logging
+
+from bot.settings import DB_NAME, SHEET_OUTBOX_FLUSH_INTERVAL, SHEET_OUTBOX_BATCH_SIZE, SHEET_OUTBOX_MAX_BACKOFF
+from database.main import DatabaseManager
+from google_spreadsheets.functions import save_rows_to_sheet
+from google_spreadsheets.mirror import get_mirror_row, get_version_row
+
+
+class SheetOutbox:
+    """
+       A durable SQLite-backed queue of spreadsheet rows that are appended in batches.
+    """
+    def __init__(self, flush_interval: float, batch_size: int, max_backoff: float):
+        """
+            Initialize the outbox.
+
+            Args:
+                flush_interval (float): Seconds between flushes of the pending rows.
+                batch_size (int): The number of pending rows that triggers an early flush, and the
+                    maximum number of rows appended in one request.
+                max_backoff (float): The maximum delay in seconds between retries of a failed append.
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.pending = 0
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, row: list, changes=None):
+        """
+            Stores a row in the outbox and its indicator in the user input mirror. The row is durable once this
+            coroutine returns.
+
+            Args:
+                row (list): A list of data to be saved in the sheet.
+                changes (optional): A coroutine function called with the DatabaseManager of the transaction, to
+                                    commit other changes together with the row.
+        """
+        async def write_row(writer_db: DatabaseManager):
+            await writer_db.insert_data(table_name="sheet_outbox", data={"payload": json.dumps(row)})
+            await writer_db.upsert_many(table_name="user_input_mirror", rows=[get_mirror_row(row)],
+                                        key="personal_account")
+            await writer_db.upsert_many(table_name="sync_state", rows=[get_version_row()], key="key")
+            if changes is not None:
+                await changes(writer_db)
+
+        async with DatabaseManager(DB_NAME) as db:
+            await db.run_in_transaction(write_row)
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """
+            Appends the pending rows to the spreadsheet in batches and removes them from the outbox.
+
+            Returns:
+                int: The number of rows appended.
+        """
+        appended = 0
+        while True:
+            async with DatabaseManager(DB_NAME) as db:
+                records = await db.get_first_rows(table_name="sheet_outbox", order_by="id", limit=self.batch_size)
+
+            if not records:
+                self.pending = 0
+                return appended
+
+            await save_rows_to_sheet(rows=[json.loads(record["payload"]) for record in records])
+
+            async with DatabaseManager(DB_NAME) as db:
+                await db.delete_many(table_name="sheet_outbox", column="id",
+                                     values=[record["id"] for record in records])
+
+            appended += len(records)
+            self.pending = max(self.pending - len(records), 0)
+            if len(records) < self.batch_size:
+                return appended
+
+    async def run(self):
+        """
+            Flushes the outbox until cancelled, backing off after failed appends.
+        """
+        backoff = 0
+        while True:
+            if backoff:
+                await asyncio.sleep(backoff)
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            try:
+                appended = await self.flush()
+                if appended:
+                    logging.info(msg=f"Appended {appended} rows from the sheet outbox")
+                backoff = 0
+            except Exception as e:
+                backoff = min(max(backoff * 2, self.flush_interval), self.max_backoff)
+                logging.error(msg=f"Can't append the sheet outbox, retrying in {backoff} seconds: {e}")
+
+
+sheet_outbox = SheetOutbox(flush_interval=SHEET_OUTBOX_FLUSH_INTERVAL, batch_size=SHEET_OUTBOX_BATCH_SIZE,
+                           max_backoff=SHEET_OUTBOX_MAX_BACKOFF)
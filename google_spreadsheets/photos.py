@@ -0,0 +1,115 @@
+"""
+This module contains the image-processing stage that shrinks meter photos before they are uploaded to Drive.
+
+Telegram keeps every photo in several sizes. The smallest size whose longer side reaches PHOTO_TARGET_SIZE is
+uploaded as it is; when that size is still much larger than the target, it is downscaled and recompressed with
+Pillow. Resizing is CPU-bound, so it runs in a process pool and does not block the event loop. The pool is
+started on first use with the spawn method, so the workers do not inherit the threads of the bot. Spawned
+workers import this module, so it must not import the bot modules: bot.settings would set up logging with
+another handler on the same log file in every worker. The processor instance is created in
+google_spreadsheets.functions instead.
+"""
+
+import asyncio
+import io
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+# A Telegram size up to this factor larger than the target is uploaded without resizing.
+RESIZE_TOLERANCE = 1.25
+
+
+def choose_photo_size(photos: list, target: int):
+    """
+        Picks the Telegram size of a photo to upload.
+
+        Args:
+            photos (list): The PhotoSize objects of the message, from the smallest to the largest.
+            target (int): The wanted length of the longer side in pixels. 0 picks the largest size.
+
+        Returns:
+            tuple: The chosen PhotoSize and whether it has to be downscaled to the target.
+    """
+    if not target:
+        return photos[-1], False
+
+    for photo in sorted(photos, key=lambda size: max(size.width, size.height)):
+        longer_side = max(photo.width, photo.height)
+        if longer_side >= target:
+            return photo, longer_side > target * RESIZE_TOLERANCE
+
+    # No size reaches the target, so the largest one is uploaded; photos are never upscaled.
+    return photos[-1], False
+
+
+def downscale_jpeg(data: bytes, target: int, quality: int) -> bytes:
+    """
+        Downscales an image so its longer side is at most the target and recompresses it as JPEG.
+
+        Runs in the worker processes of PhotoProcessor.
+
+        Args:
+            data (bytes): The encoded image.
+            target (int): The maximum length of the longer side in pixels.
+            quality (int): The JPEG quality from 1 to 95.
+
+        Returns:
+            bytes: The recompressed JPEG, or the original data if recompressing did not make it smaller.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((target, target), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+    result = output.getvalue()
+    return result if len(result) < len(data) else data
+
+
+class PhotoProcessor:
+    """
+       Downscales photos in a pool of worker processes that is started on first use.
+    """
+    def __init__(self, workers: int = 2):
+        """
+            Initialize the processor.
+
+            Args:
+                workers (int): The number of worker processes.
+        """
+        self.workers = workers
+        self._executor = None
+
+    async def downscale(self, data: bytes, target: int, quality: int) -> bytes:
+        """
+            Downscales and recompresses an image in a worker process.
+
+            Args:
+                data (bytes): The encoded image.
+                target (int): The maximum length of the longer side in pixels.
+                quality (int): The JPEG quality from 1 to 95.
+
+            Returns:
+                bytes: The recompressed JPEG, or the original data if it could not be made smaller.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, downscale_jpeg, data, target, quality)
+
+    def shutdown(self):
+        """
+            Stops the worker processes, if they were started.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
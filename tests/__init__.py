@@ -0,0 +1,3 @@
+"""
+Tests of the database layer, the scheduler, the FSM storage, the rate limiter and the keyboard cache.
+"""
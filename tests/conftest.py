@@ -0,0 +1,48 @@
+"""
+Shared setup of the tests.
+
+The bot modules read their settings at import time, so the environment is prepared before any of them is imported:
+the default database and the log file point at a temporary directory and a dummy token is provided if none is set.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+
+_workdir = tempfile.mkdtemp(prefix="tests-")
+os.environ["DB_NAME"] = os.path.join(_workdir, "tests.db")
+os.environ["LOG_FILE"] = os.path.join(_workdir, "tests.log")
+os.environ.setdefault("BOT_TOKEN", "123456:TESTS-TESTS-TESTS-TESTS-TESTS-TESTS")
+
+from database.main import DatabaseManager  # noqa: E402
+
+
+async def create_database(db_name: str):
+    """
+        Creates the tables of the bot and applies every migration.
+
+        Args:
+            db_name (str): The name of the SQLite database file.
+
+        Returns:
+            int: The schema version after applying the migrations.
+    """
+    async with DatabaseManager(db_name) as db:
+        await db.create_tables()
+        return await db.apply_migrations()
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """A path of a database file that does not exist yet."""
+    return str(tmp_path / "bot.db")
+
+
+@pytest.fixture
+def migrated_db(db_name):
+    """A database with the tables of the bot and every migration applied."""
+    asyncio.run(create_database(db_name))
+    return db_name
@@ -0,0 +1,49 @@
+"""
+Tests of the cache of account keyboards.
+"""
+
+from bot.keyboards import AccountKeyboardCache
+from bot.texts import back_button_text
+
+
+LANGUAGE = next(iter(back_button_text))
+
+
+def test_keyboard_is_reused_for_the_same_accounts():
+    cache = AccountKeyboardCache(maxsize=10)
+    keyboard = cache.get(1, LANGUAGE, ["100", "200"])
+
+    assert cache.get(1, LANGUAGE, ["100", "200"]) is keyboard
+    assert cache.get(1, LANGUAGE, ["100", "200"], indicator=True) is not keyboard
+    assert cache.get(2, LANGUAGE, ["100", "200"]) is not keyboard
+
+
+def test_keyboard_is_rebuilt_when_the_accounts_differ():
+    cache = AccountKeyboardCache(maxsize=10)
+    keyboard = cache.get(1, LANGUAGE, ["100"])
+    rebuilt = cache.get(1, LANGUAGE, ["100", "200"])
+
+    assert rebuilt is not keyboard
+    assert [row[0].text for row in rebuilt.keyboard[:2]] == ["100", "200"]
+
+
+def test_invalidate_evicts_every_keyboard_of_the_user():
+    cache = AccountKeyboardCache(maxsize=10)
+    modes = [(language, indicator) for language in back_button_text for indicator in (False, True)]
+    keyboards = {mode: cache.get(1, mode[0], ["100"], indicator=mode[1]) for mode in modes}
+    other = cache.get(2, LANGUAGE, ["100"])
+
+    cache.invalidate(1)
+
+    assert all(cache.get(1, language, ["100"], indicator=indicator) is not keyboards[(language, indicator)]
+               for language, indicator in modes)
+    assert cache.get(2, LANGUAGE, ["100"]) is other
+
+
+def test_cache_is_bounded():
+    cache = AccountKeyboardCache(maxsize=2)
+    first = cache.get(1, LANGUAGE, ["100"])
+    cache.get(2, LANGUAGE, ["100"])
+    cache.get(3, LANGUAGE, ["100"])
+
+    assert cache.get(1, LANGUAGE, ["100"]) is not first
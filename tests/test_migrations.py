@@ -0,0 +1,75 @@
+"""
+Tests of the schema migrations and the readings trigger they install.
+"""
+
+import asyncio
+
+import pytest
+
+from database.main import DatabaseManager
+from database.migrations import MIGRATIONS
+from tests.conftest import create_database
+
+
+LATEST_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+
+def test_migration_versions_are_unique_and_ascending():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_migrations_are_idempotent(db_name):
+    async def scenario():
+        first = await create_database(db_name)
+        second = await create_database(db_name)
+        async with DatabaseManager(db_name) as db:
+            rows = await db.get_all_data_from_table(table_name="schema_version")
+        return first, second, rows
+
+    first, second, rows = asyncio.run(scenario())
+    assert first == second == LATEST_VERSION
+    assert [row["version"] for row in rows] == list(range(1, LATEST_VERSION + 1))
+
+
+def test_failing_migration_keeps_previous_version(migrated_db):
+    migrations = MIGRATIONS + [(LATEST_VERSION + 1, "Broken", ["CREATE TABLE broken (id INTEGER)",
+                                                               "INSERT INTO missing VALUES (1)"])]
+
+    async def scenario():
+        async with DatabaseManager(migrated_db) as db:
+            with pytest.raises(Exception):
+                await db.apply_migrations(migrations)
+        async with DatabaseManager(migrated_db) as db:
+            await db.cursor.execute("SELECT MAX(version) FROM schema_version")
+            version = (await db.cursor.fetchone())[0]
+            await db.cursor.execute("SELECT name FROM sqlite_master WHERE name = 'broken'")
+            table = await db.cursor.fetchone()
+        return version, table
+
+    version, table = asyncio.run(scenario())
+    assert version == LATEST_VERSION
+    assert table is None
+
+
+def test_monthly_consumption_with_out_of_order_readings(migrated_db):
+    readings = [("2026-03-10 10:00:00", 200),
+                ("2026-01-25 10:00:00", 130),
+                ("2026-02-20 10:00:00", 180),
+                ("2026-01-05 10:00:00", 100)]
+
+    async def scenario():
+        async with DatabaseManager(migrated_db) as db:
+            for date, indicator in readings:
+                await db.add_readings(readings=[{"personal_account": "100", "date": date,
+                                                 "indicator": indicator, "source": "bot"}])
+            # The same reading recorded again is skipped.
+            added = await db.add_readings(readings=[{"personal_account": "100", "date": readings[0][0],
+                                                     "indicator": readings[0][1], "source": "bot"}])
+        async with DatabaseManager(migrated_db) as db:
+            return added, await db.get_monthly_consumption("100")
+
+    added, months = asyncio.run(scenario())
+    assert added == 0
+    assert [(month["month"], month["readings"], month["last_indicator"], month["consumption"])
+            for month in months] == [("2026-03", 1, 200, 20), ("2026-02", 1, 180, 50), ("2026-01", 2, 130, 30)]
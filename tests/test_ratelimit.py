@@ -0,0 +1,49 @@
+"""
+Tests of the token bucket rate limiter.
+"""
+
+import asyncio
+import time
+
+from bot import ratelimit
+from bot.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_sustained_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+    clock.now += 0.5
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    # The bucket never holds more than its capacity.
+    clock.now += 60
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_capacity_defaults_to_rate():
+    assert TokenBucket(rate=5).capacity == 5
+    assert TokenBucket(rate=0.5).capacity == 1
+
+
+def test_acquire_waits_for_tokens():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) >= 0.015
@@ -0,0 +1,43 @@
+"""
+Tests of the cron expressions of the scheduler.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from bot.scheduler import CronSchedule
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", datetime(2026, 10, 17, 10, 7), datetime(2026, 10, 17, 10, 15)),
+    ("0 19 * * *", datetime(2026, 10, 17, 19, 0), datetime(2026, 10, 18, 19, 0)),
+    ("0 0 L * *", datetime(2024, 2, 1), datetime(2024, 2, 29)),
+    ("0 0 L * *", datetime(2026, 2, 1), datetime(2026, 2, 28)),
+    ("0 19 L-2 * *", datetime(2026, 2, 1), datetime(2026, 2, 26, 19, 0)),
+    ("0 19 L-2 * *", datetime(2026, 4, 28, 19, 0), datetime(2026, 5, 29, 19, 0)),
+    ("30 8 1,L * *", datetime(2026, 1, 2), datetime(2026, 1, 31, 8, 30)),
+    # Both the day of month and the day of week must match: the first Monday of the month.
+    ("0 9 1-7 * 1", datetime(2026, 10, 17), datetime(2026, 11, 2, 9, 0)),
+    ("0 9 * * 0", datetime(2026, 10, 17), datetime(2026, 10, 18, 9, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_previous_before():
+    schedule = CronSchedule("0 19 L-2 * *")
+    assert schedule.previous_before(datetime(2026, 3, 29, 19, 0)) == datetime(2026, 3, 29, 19, 0)
+    assert schedule.previous_before(datetime(2026, 3, 29, 18, 59)) == datetime(2026, 2, 26, 19, 0)
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * 13 *",
+                                        "* * * * 7", "5-1 * * * *", "*/0 * * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_expression_that_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *").next_after(datetime(2026, 1, 1))
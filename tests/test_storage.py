@@ -0,0 +1,70 @@
+"""
+Tests of the SQLite FSM storage.
+"""
+
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.storage import SQLiteStorage
+from database.main import DatabaseManager
+
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+async def get_rows(db_name: str):
+    async with DatabaseManager(db_name) as db:
+        return await db.get_all_data_from_table(table_name="fsm_storage")
+
+
+def test_changes_are_buffered_until_flushed(migrated_db):
+    async def scenario():
+        storage = SQLiteStorage(migrated_db, flush_interval=60)
+        await storage.set_state(KEY, "UserState:main_menu")
+        await storage.set_data(KEY, {"account": "100"})
+        buffered = await get_rows(migrated_db)
+        await storage.close()
+
+        reloaded = SQLiteStorage(migrated_db, flush_interval=60)
+        state, data = await reloaded.get_state(KEY), await reloaded.get_data(KEY)
+        await reloaded.close()
+        return buffered, await get_rows(migrated_db), state, data
+
+    buffered, rows, state, data = asyncio.run(scenario())
+    assert buffered == []
+    assert len(rows) == 1
+    assert state == "UserState:main_menu"
+    assert data == {"account": "100"}
+
+
+def test_finished_conversation_is_deleted(migrated_db):
+    async def scenario():
+        storage = SQLiteStorage(migrated_db, flush_interval=60)
+        await storage.set_state(KEY, "UserState:main_menu")
+        await storage.flush()
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+        return await get_rows(migrated_db)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_expired_conversations_are_removed(migrated_db):
+    async def scenario():
+        storage = SQLiteStorage(migrated_db, ttl=0.05, flush_interval=60)
+        await storage.set_state(KEY, "UserState:main_menu")
+        await storage.flush()
+        stored = await get_rows(migrated_db)
+        time.sleep(0.1)
+        await storage.expire()
+        state = await storage.get_state(KEY)
+        await storage.close()
+        return stored, await get_rows(migrated_db), state
+
+    stored, rows, state = asyncio.run(scenario())
+    assert len(stored) == 1
+    assert rows == []
+    assert state is None
@@ -0,0 +1,89 @@
+"""
+Tests of the DatabaseWriter that group-commits the writes of DatabaseManager.
+"""
+
+import asyncio
+
+import pytest
+
+from bot.metrics import DB_WRITER_BATCH
+from database.main import DatabaseManager
+from database.writer import DatabaseWriter, get_writer
+
+
+async def count_users(db_name: str):
+    async with DatabaseManager(db_name) as db:
+        return [row["telegram_id"] for row in await db.get_all_data_from_table(table_name="all_users")]
+
+
+def test_requests_are_committed_in_one_batch(migrated_db):
+    async def scenario():
+        async with DatabaseWriter(migrated_db, commit_window=0.05) as writer:
+            assert get_writer(migrated_db) is writer
+            before = DB_WRITER_BATCH.values().get((), {"sum": 0, "count": 0})
+
+            async def insert(telegram_id):
+                async with DatabaseManager(migrated_db) as db:
+                    await db.insert_data(table_name="all_users", data={"telegram_id": telegram_id})
+
+            await asyncio.gather(*(insert(telegram_id) for telegram_id in range(5)))
+            after = DB_WRITER_BATCH.values()[()]
+
+        assert get_writer(migrated_db) is None
+        return before, after, await count_users(migrated_db)
+
+    before, after, users = asyncio.run(scenario())
+    assert after["count"] - before["count"] == 1
+    assert after["sum"] - before["sum"] == 5
+    assert sorted(users) == list(range(5))
+
+
+def test_failing_request_does_not_affect_its_batch(migrated_db):
+    async def scenario():
+        async with DatabaseWriter(migrated_db, commit_window=0.05):
+            async def insert(telegram_id):
+                async with DatabaseManager(migrated_db) as db:
+                    await db.insert_data(table_name="all_users", data={"telegram_id": telegram_id})
+
+            async def fail():
+                async def write_changes(writer_db: DatabaseManager):
+                    await writer_db.insert_data(table_name="all_users", data={"telegram_id": 99})
+                    raise ValueError("broken request")
+
+                async with DatabaseManager(migrated_db) as db:
+                    await db.run_in_transaction(write_changes)
+
+            results = await asyncio.gather(insert(1), fail(), insert(2), return_exceptions=True)
+
+        return results, await count_users(migrated_db)
+
+    results, users = asyncio.run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], ValueError)
+    assert sorted(users) == [1, 2]
+
+
+def test_writer_keeps_running_after_failed_exclusive_request(migrated_db):
+    async def scenario():
+        async with DatabaseWriter(migrated_db, commit_window=0) as writer:
+            async def broken(conn):
+                raise ValueError("broken request")
+
+            with pytest.raises(ValueError):
+                await writer.submit(broken, exclusive=True)
+
+            async with DatabaseManager(migrated_db) as db:
+                await db.insert_data(table_name="all_users", data={"telegram_id": 1})
+
+        return await count_users(migrated_db)
+
+    assert asyncio.run(scenario()) == [1]
+
+
+def test_submit_to_closed_writer_raises(migrated_db):
+    async def scenario():
+        writer = DatabaseWriter(migrated_db)
+        with pytest.raises(RuntimeError):
+            await writer.submit(lambda conn: None)
+
+    asyncio.run(scenario())